@@ -1,10 +1,10 @@
-import asyncio, typer
-from aiogram import Bot
+import asyncio, sys, typer
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.config import load_config
-from app.db import init_engine
+from app.db import ensure_indexes, init_engine
 from app.models import Base, User, ChatLog
 from app.repositories import list_users
 from app.dynamic_products import list_existing_category_tables
@@ -18,6 +18,7 @@ def init_db():
     async def _run():
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(ensure_indexes, ChatLog.__table__)
         await engine.dispose()
     asyncio.run(_run())
     typer.echo("OK")
@@ -46,6 +47,44 @@ def chats(limit: int = 50):
         await engine.dispose()
     asyncio.run(_run())
 
+@app.command("export-chats")
+def export_chats(out: str = typer.Option("-", help="файл; «-» — stdout"),
+                 fmt: str = typer.Option("csv", "--format", help="csv или jsonl"),
+                 user: int = typer.Option(None, help="tg_id пользователя"),
+                 since: datetime = typer.Option(None, formats=["%Y-%m-%d"], help="с даты (UTC)"),
+                 until: datetime = typer.Option(None, formats=["%Y-%m-%d"], help="по дату включительно (UTC)")):
+    from app.chatlog import export_chat_logs
+    if fmt not in ("csv", "jsonl"):
+        raise typer.BadParameter("csv или jsonl", param_hint="--format")
+    cfg = load_config()
+    engine, Session = init_engine(cfg.database_url)
+    async def _run(f):
+        try:
+            async with Session() as s:
+                return await export_chat_logs(s, f, fmt, tg_id=user, since=since,
+                                              until=until + timedelta(days=1) if until else None)
+        finally:
+            await engine.dispose()
+    if out == "-":
+        n = asyncio.run(_run(sys.stdout))
+    else:
+        with open(out, "w", encoding="utf-8", newline="") as f:
+            n = asyncio.run(_run(f))
+    typer.echo(f"Выгружено записей: {n}", err=True)
+
+@app.command("prune-chats")
+def prune_chats(days: int = typer.Option(None, help="старше скольких дней; по умолчанию chat_log.retention_days")):
+    from app.chatlog import prune_chat_logs
+    cfg = load_config()
+    engine, Session = init_engine(cfg.database_url)
+    async def _run():
+        try:
+            return await prune_chat_logs(Session, days if days is not None else cfg.chat_log.retention_days,
+                                         cfg.chat_log.retention_batch)
+        finally:
+            await engine.dispose()
+    typer.echo(f"Удалено записей: {asyncio.run(_run())}")
+
 @app.command("categories")
 def categories():
     cfg = load_config()
@@ -61,33 +100,75 @@ def categories():
         await engine.dispose()
     asyncio.run(_run())
 
-@app.command("broadcast")
-def broadcast(message: str):
+@app.command("catalog-rollback")
+def catalog_rollback():
+    from app.dynamic_products import rollback_catalog
     cfg = load_config()
     engine, Session = init_engine(cfg.database_url)
-    bot = Bot(cfg.bot_token, parse_mode="HTML")
     async def _run():
-        sent = failed = 0
         async with Session() as s:
-            res = await s.execute(select(User))
-            users = list(res.scalars().all())
-        for u in users:
-            try:
-                await bot.send_message(u.tg_id, message)
-                sent += 1
-            except Exception:
-                failed += 1
-        await bot.session.close()
+            ok = await rollback_catalog(s)
         await engine.dispose()
-        print(f"Отправлено: {sent}, ошибок: {failed}")
+        return ok
+    typer.echo("Каталог возвращён к предыдущей версии." if asyncio.run(_run()) else "Предыдущей версии нет.")
+
+@app.command("broadcast")
+def broadcast(message: str,
+              job_id: str = typer.Option(None, help="id рассылки; с тем же id прерванная рассылка продолжится"),
+              subscribed_only: bool = typer.Option(False, help="только подписанным на авторассылку")):
+    from app.broadcast import Broadcaster
+    from app.telegram import make_bot
+    cfg = load_config()
+    engine, Session = init_engine(cfg.database_url)
+    bot = make_bot(cfg)
+    async def _run():
+        b = cfg.broadcast
+        try:
+            broadcaster = Broadcaster(bot, Session, rate_per_sec=b.rate_per_sec,
+                                      per_chat_interval=b.per_chat_interval,
+                                      concurrency=b.concurrency, chunk_size=b.chunk_size)
+            stats = await broadcaster.run(message, job_id=job_id, only_subscribed=subscribed_only)
+        finally:
+            await bot.session.close()
+            await engine.dispose()
+        print(f"Отправлено: {stats.sent}, ошибок: {stats.failed}, заблокировали: {stats.blocked}")
+        print(stats)
     asyncio.run(_run())
 
 @app.command("scrape-now")
 def scrape_now():
-    from app.scheduler import _daily_scrape_full_replace
+    """Обновление каталога через очередь jobs: идущий парсинг не запускается второй раз.
+
+    Задачу выполняет scrape-воркер супервизора, а если его нет — сама команда.
+    """
+    import os
+    from functools import partial
+    from app.jobs import ACTIVE, SCRAPE, JobWorker, enqueue_job
+    from app.models import Job
+    from app.scheduler import _scrape_job
     cfg = load_config()
-    asyncio.run(_daily_scrape_full_replace(cfg))
-    typer.echo("Готово.")
+    engine, Session = init_engine(cfg.database_url)
+    sup = cfg.supervisor
+    worker = JobWorker(Session, {SCRAPE: partial(_scrape_job, cfg)}, name=f"admin-{os.getpid()}",
+                       heartbeat_interval=sup.heartbeat_interval, stale_after=sup.stale_after,
+                       max_attempts=sup.max_attempts)
+    async def _run():
+        try:
+            async with Session() as s:
+                job_id, joined = await enqueue_job(s, SCRAPE, dedup_key=SCRAPE)
+            typer.echo(f"Обновление уже идёт (задача #{job_id}), ждём его." if joined else f"Задача #{job_id} поставлена.")
+            while True:
+                # dedup_key допускает одну активную задачу парсинга — забрать можно только её
+                if not await worker.run_once():
+                    await asyncio.sleep(sup.poll_interval)
+                async with Session() as s:
+                    job = await s.get(Job, job_id)
+                    if job.status not in ACTIVE:
+                        return job
+        finally:
+            await engine.dispose()
+    job = asyncio.run(_run())
+    typer.echo(f"Задача #{job.id}: {job.status}. {job.result or ''}")
 
 if __name__ == "__main__":
     app()
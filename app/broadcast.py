@@ -0,0 +1,243 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .models import User, BroadcastCheckpoint
+from .repositories import user_cache
+
+class TokenBucket:
+    """Глобальный лимит скорости: `rate` токенов в секунду, всплеск до `capacity`.
+
+    pause() останавливает выдачу токенов всем отправителям — так
+    соблюдается retry_after из ответа 429.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ChatLimiter:
+    """Не чаще одного сообщения в чат за `interval` секунд."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._last: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int):
+        last = self._last.get(chat_id)
+        if last is not None:
+            delay = last + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._last[chat_id] = time.monotonic()
+
+    def forget(self, chat_ids):
+        for c in chat_ids:
+            self._last.pop(c, None)
+
+@dataclass
+class BroadcastStats:
+    job_id: str
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retried: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"рассылка {self.job_id}: отправлено={self.sent} ошибок={self.failed} "
+                f"заблокировали={self.blocked} повторов(429)={self.retried} "
+                f"за {self.elapsed:.1f}s ({self.rate:.1f} сообщ/с)")
+
+async def iter_recipients(Session: async_sessionmaker[AsyncSession], after_id: int = 0,
+                          chunk_size: int = 500, only_subscribed: bool = True) -> AsyncIterator[List[tuple[int, int]]]:
+    """Порции (users.id, tg_id) по возрастанию id — keyset-пагинация, без OFFSET и без загрузки всех сразу."""
+    last = after_id
+    while True:
+        q = select(User.id, User.tg_id).where(User.id > last).order_by(User.id).limit(chunk_size)
+        if only_subscribed:
+            q = q.where(User.subscribed == True)
+        async with Session() as s:
+            rows = [(r[0], r[1]) for r in (await s.execute(q)).all()]
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+class Broadcaster:
+    """Рассылка с ограничением параллелизма, глобальным и початовым лимитами.
+
+    429 (TelegramRetryAfter) приостанавливает всю рассылку на retry_after
+    и повторяет отправку; заблокировавшие бота (403) отписываются.
+    Прогресс сохраняется в broadcast_checkpoints после каждой порции,
+    поэтому прерванную рассылку можно продолжить с того же job_id.
+    """
+
+    def __init__(self, bot: Bot, Session: async_sessionmaker[AsyncSession], rate_per_sec: float = 25.0,
+                 per_chat_interval: float = 1.0, concurrency: int = 20, chunk_size: int = 500,
+                 max_retries: int = 5, checkpoint_interval: float = 2.0):
+        self.bot = bot
+        self.Session = Session
+        self.bucket = TokenBucket(rate_per_sec)
+        self.chats = ChatLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.checkpoint_interval = checkpoint_interval
+
+    async def _send_one(self, chat_id: int, text: str, stats: BroadcastStats, sem: asyncio.Semaphore) -> str:
+        async with sem:
+            for _ in range(self.max_retries + 1):
+                await self.chats.wait(chat_id)
+                await self.bucket.acquire()
+                try:
+                    await self.bot.send_message(chat_id, text)
+                    stats.sent += 1
+                    return "sent"
+                except TelegramRetryAfter as e:
+                    stats.retried += 1
+                    self.bucket.pause(e.retry_after)
+                except TelegramForbiddenError:
+                    stats.blocked += 1
+                    return "blocked"
+                except Exception:
+                    break
+            stats.failed += 1
+            return "failed"
+
+    async def _load_checkpoint(self, job_id: str) -> BroadcastCheckpoint | None:
+        async with self.Session() as s:
+            return await s.get(BroadcastCheckpoint, job_id)
+
+    async def _save_checkpoint(self, stats: BroadcastStats, last_user_id: int, blocked_tg: List[int], done: bool = False):
+        async with self.Session() as s:
+            if blocked_tg:
+                await s.execute(update(User).where(User.tg_id.in_(blocked_tg)).values(subscribed=False))
+                user_cache.forget(blocked_tg)
+            cp = await s.get(BroadcastCheckpoint, stats.job_id)
+            if cp is None:
+                cp = BroadcastCheckpoint(job_id=stats.job_id)
+                s.add(cp)
+            cp.last_user_id, cp.done, cp.updated_at = last_user_id, done, datetime.utcnow()
+            cp.sent, cp.failed, cp.blocked = stats.sent, stats.failed, stats.blocked
+            await s.commit()
+
+    async def _send_chunk(self, chunk: List[tuple[int, int]], text: str | Dict[int, str | List[str]], stats: BroadcastStats,
+                          sem: asyncio.Semaphore, after_id: int) -> int:
+        """Отправляет порцию; контрольная точка — по непрерывному префиксу завершённых отправок.
+
+        Сохраняется раз в checkpoint_interval и при отмене, так что после
+        перезапуска повторно получат сообщение только те, чья отправка
+        была в полёте. text — общий текст или свой для каждого tg_id
+        (строка или несколько сообщений подряд).
+        """
+        done = [False] * len(chunk)
+        blocked: List[int] = []
+        pos = -1  # последний индекс, до которого всё завершено
+
+        def watermark() -> int:
+            nonlocal pos
+            while pos + 1 < len(chunk) and done[pos + 1]:
+                pos += 1
+            return chunk[pos][0] if pos >= 0 else after_id
+
+        async def one(i: int, tg_id: int):
+            msgs = text if isinstance(text, str) else text[tg_id]
+            for msg in [msgs] if isinstance(msgs, str) else msgs:
+                if await self._send_one(tg_id, msg, stats, sem) == "blocked":
+                    blocked.append(tg_id)
+                    break
+            done[i] = True
+
+        async def flush():
+            ids = blocked[:]
+            del blocked[:len(ids)]
+            await self._save_checkpoint(stats, watermark(), ids)
+
+        tasks = [asyncio.create_task(one(i, tg_id)) for i, (_, tg_id) in enumerate(chunk)]
+        pending = set(tasks)
+        try:
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=self.checkpoint_interval)
+                await flush()
+        finally:
+            if pending:  # отмена: фиксируем то, что успели
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                await asyncio.shield(flush())
+        self.chats.forget(tg_id for _, tg_id in chunk)
+        return chunk[-1][0]
+
+    async def _resume(self, job_id: str | None) -> tuple[BroadcastStats, int | None]:
+        """Статистика и users.id, с которого продолжать; None — рассылка уже завершена."""
+        stats = BroadcastStats(job_id=job_id or uuid.uuid4().hex[:12])
+        cp = await self._load_checkpoint(stats.job_id) if job_id else None
+        if cp is None:
+            return stats, 0
+        stats.sent, stats.failed, stats.blocked = cp.sent, cp.failed, cp.blocked
+        return stats, None if cp.done else cp.last_user_id
+
+    async def run(self, text: str, job_id: str | None = None, only_subscribed: bool = True) -> BroadcastStats:
+        stats, after_id = await self._resume(job_id)
+        if after_id is None:
+            return stats
+        sem = asyncio.Semaphore(self.concurrency)
+        async for chunk in iter_recipients(self.Session, after_id, self.chunk_size, only_subscribed):
+            after_id = await self._send_chunk(chunk, text, stats, sem, after_id)
+        await self._save_checkpoint(stats, after_id, [], done=True)
+        return stats
+
+    async def run_personal(self, messages: List[tuple[int, int, str | List[str]]], job_id: str | None = None) -> BroadcastStats:
+        """Каждому получателю свой текст: messages — (users.id, tg_id, текст или список сообщений).
+
+        Лимиты и контрольная точка — как в run().
+        """
+        stats, after_id = await self._resume(job_id)
+        if after_id is None:
+            return stats
+        todo = sorted((m for m in messages if m[0] > after_id), key=lambda m: m[0])
+        sem = asyncio.Semaphore(self.concurrency)
+        for start in range(0, len(todo), self.chunk_size):
+            part = todo[start:start + self.chunk_size]
+            after_id = await self._send_chunk([(uid, tg) for uid, tg, _ in part], {tg: t for _, tg, t in part},
+                                              stats, sem, after_id)
+        await self._save_checkpoint(stats, after_id, [], done=True)
+        return stats
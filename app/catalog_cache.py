@@ -0,0 +1,61 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class CatalogCache:
+    """Кэш чтений каталога в памяти процесса.
+
+    Значения (список таблиц, отрендеренные сниппеты) живут до смены версии
+    каталога — её увеличивает invalidate() после публикации — либо до
+    истечения ttl, страхующего от пропущенной инвалидации. Одновременные
+    промахи по одному ключу загружают значение один раз.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: Dict[Hashable, Tuple[int, float, Any]] = {}
+        # замок single-flight и число ждущих его корутин; удаляется, когда ждущих не осталось
+        self._locks: Dict[Hashable, Tuple[asyncio.Lock, int]] = {}
+
+    def invalidate(self):
+        self.version += 1
+        self._data.clear()
+
+    def _fresh(self, key: Hashable):
+        entry = self._data.get(key)
+        if entry is not None and entry[0] == self.version and time.monotonic() - entry[1] < self.ttl:
+            return entry
+        return None
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._fresh(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[2]
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                entry = self._fresh(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry[2]
+                self.misses += 1
+                version = self.version
+                value = await loader()
+                # за время загрузки каталог могли перепубликовать — такое значение не кэшируем
+                if version == self.version:
+                    self._data[key] = (version, time.monotonic(), value)
+                return value
+        finally:
+            # ключи с курсорами страниц не должны копить замки от версии к версии
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+catalog_cache = CatalogCache()
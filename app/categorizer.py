@@ -1,4 +1,5 @@
-from typing import List
+import re
+from typing import Iterable, List
 from app.config import CategoryConf
 
 def pick_category_name(title: str, categories_conf: List[CategoryConf]) -> str | None:
@@ -14,3 +15,40 @@ def pick_category_name(title: str, categories_conf: List[CategoryConf]) -> str |
         if any(k in t for k in kws):
             return name
     return best
+
+class Categorizer:
+    """Классификатор, собранный один раз из cfg.categories.
+
+    Все ключевые слова компилируются в одну regex-альтернацию внутри
+    lookahead, поэтому за один проход находятся совпадения во всех позициях
+    строки. Альтернативы упорядочены по приоритету категорий: в каждой позиции
+    regex берёт слово самой приоритетной категории, а из всех позиций
+    выбирается минимальный приоритет. Результат совпадает с pick_category_name:
+    побеждает первая по порядку категория, иначе — первая категория без слов.
+    """
+
+    def __init__(self, categories_conf: List[CategoryConf]):
+        self.names = [c.name for c in categories_conf]
+        self.fallback = next((c.name for c in categories_conf if not c.keywords), None)
+
+        self._rank: dict[str, int] = {}
+        for i, conf in enumerate(categories_conf):
+            for k in conf.keywords:
+                self._rank.setdefault(k.lower(), i)
+        if self._rank:
+            alts = sorted(self._rank, key=lambda k: (self._rank[k], -len(k)))
+            self._rx = re.compile("(?=(" + "|".join(re.escape(k) for k in alts) + "))")
+        else:
+            self._rx = None
+
+    def categorize(self, title: str) -> str | None:
+        if self._rx is None:
+            return self.fallback
+        found = self._rx.findall((title or "").lower())
+        if not found:
+            return self.fallback
+        rank = self._rank
+        return self.names[min(rank[k] for k in found)]
+
+    def categorize_many(self, titles: Iterable[str]) -> List[str | None]:
+        return [self.categorize(t) for t in titles]
@@ -0,0 +1,192 @@
+import asyncio
+import csv
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, TextIO
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import SendMessage
+from aiogram.types import Message, TelegramObject
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .models import ChatLog
+
+log = logging.getLogger(__name__)
+
+class ChatLogWriter:
+    """Журнал переписки вне пути ответа пользователю.
+
+    log() только кладёт запись в очередь; фоновая задача пишет их пачками
+    по batch_size или раз в flush_interval секунд. Если БД не успевает и
+    очередь заполнена, запись отбрасывается со счётчиком dropped
+    (on_overflow="drop") либо log_wait() ждёт места (on_overflow="block").
+    close() дописывает остаток очереди.
+    """
+
+    def __init__(self, Session: async_sessionmaker[AsyncSession], batch_size: int = 200,
+                 flush_interval: float = 1.0, max_queue: int = 10000, on_overflow: str = "drop"):
+        self.Session = Session
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_overflow = on_overflow
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=max_queue)  # None — остановка _run
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _row(tg_id: int, direction: str, text: str | None) -> dict:
+        return {"tg_id": tg_id, "direction": direction, "text": (text or "")[:4096], "created_at": datetime.utcnow()}
+
+    def log(self, tg_id: int, direction: str, text: str | None) -> bool:
+        try:
+            self._queue.put_nowait(self._row(tg_id, direction, text))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def log_wait(self, tg_id: int, direction: str, text: str | None):
+        if self.on_overflow == "block":
+            await self._queue.put(self._row(tg_id, direction, text))
+        else:
+            self.log(tg_id, direction, text)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            if not self._task.done():
+                # не cancel(): _run допишет уже взятую из очереди пачку и выйдет сам
+                await self._queue.put(None)
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+
+    def _drain(self, limit: int) -> list[dict]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: list[dict]):
+        if not batch:
+            return
+        for attempt in range(3):
+            try:
+                async with self.Session() as s:
+                    await s.execute(insert(ChatLog), batch)
+                    await s.commit()
+                self.written += len(batch)
+                return
+            except Exception:
+                log.exception("Не удалось записать %d строк журнала (попытка %d)", len(batch), attempt + 1)
+                await asyncio.sleep(0.5 * (attempt + 1))
+        self.failed += len(batch)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            if row is None:
+                return
+            batch, stop = [row], False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+            if stop:
+                return
+
+async def prune_chat_logs(Session: async_sessionmaker[AsyncSession], older_than_days: int,
+                          batch_size: int = 5000, pause: float = 0.05) -> int:
+    """Удаляет записи старше срока порциями по индексу created_at.
+
+    Каждая порция — своя короткая транзакция, между ними пауза: очистка
+    большого хвоста не блокирует запись журнала и запросы бота.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+    while True:
+        oldest = select(ChatLog.id).where(ChatLog.created_at < cutoff).order_by(ChatLog.created_at).limit(batch_size)
+        async with Session() as s:
+            res = await s.execute(delete(ChatLog).where(ChatLog.id.in_(oldest)))
+            await s.commit()
+        deleted = max(res.rowcount or 0, 0)
+        total += deleted
+        if deleted < batch_size:
+            return total
+        await asyncio.sleep(pause)
+
+EXPORT_FIELDS = ("id", "tg_id", "direction", "created_at", "text")
+
+async def export_chat_logs(session: AsyncSession, out: TextIO, fmt: str = "csv", tg_id: int | None = None,
+                           since: datetime | None = None, until: datetime | None = None, chunk: int = 1000) -> int:
+    """Выгружает журнал в out (csv или jsonl) в порядке времени; until не включается.
+
+    Строки читаются через серверный курсор (session.stream) порциями по
+    chunk, так что память не зависит от объёма выгрузки.
+    """
+    q = select(ChatLog.id, ChatLog.tg_id, ChatLog.direction, ChatLog.created_at, ChatLog.text)
+    if tg_id is not None:
+        q = q.where(ChatLog.tg_id == tg_id)
+    if since is not None:
+        q = q.where(ChatLog.created_at >= since)
+    if until is not None:
+        q = q.where(ChatLog.created_at < until)
+    q = q.order_by(ChatLog.created_at, ChatLog.id).execution_options(yield_per=chunk)
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(EXPORT_FIELDS)
+    n = 0
+    result = await session.stream(q)
+    async for part in result.partitions():
+        for id_, tg, direction, created_at, text in part:
+            ts = created_at.isoformat() if created_at else None
+            if writer is not None:
+                writer.writerow((id_, tg, direction, ts, text))
+            else:
+                out.write(json.dumps(dict(zip(EXPORT_FIELDS, (id_, tg, direction, ts, text))), ensure_ascii=False) + "\n")
+        n += len(part)
+    return n
+
+class ChatLogMiddleware:
+    """Outer-middleware для входящих сообщений."""
+
+    def __init__(self, writer: ChatLogWriter):
+        self.writer = writer
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if isinstance(event, Message) and event.from_user is not None:
+            await self.writer.log_wait(event.from_user.id, "in", event.text or event.caption)
+        return await handler(event, data)
+
+class ChatLogRequestMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: журналирует успешно отправленные сообщения."""
+
+    def __init__(self, writer: ChatLogWriter):
+        self.writer = writer
+
+    async def __call__(self, make_request, bot: Bot, method):
+        response = await make_request(bot, method)
+        if isinstance(method, SendMessage) and isinstance(method.chat_id, int):
+            await self.writer.log_wait(method.chat_id, "out", method.text)
+        return response
@@ -12,6 +12,12 @@ def init_engine(db_url: str):
     Session = async_sessionmaker(_engine, expire_on_commit=False)
     return _engine, Session
 
+def ensure_indexes(conn, *tables):
+    """CREATE INDEX IF NOT EXISTS для индексов из моделей: create_all не добавляет их в уже существующие таблицы."""
+    for table in tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
 def get_sessionmaker():
     if Session is None:
         raise RuntimeError("Session не инициализирован")
@@ -1,11 +1,29 @@
 import re
+import hashlib
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
 from typing import Dict, List
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import Numeric, text, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.engine import CursorResult
 
+from .instrumentation import metrics
+from .models import PriceHistory
+from .prices import parse_price
+
+log = logging.getLogger(__name__)
+
 PRODUCTS_PREFIX = "products_"
+# режим swap: новая версия каталога собирается в теневой схеме,
+# предыдущая после переключения хранится для отката
+SHADOW_SCHEMA = "catalog_shadow"
+PREV_SCHEMA = "catalog_prev"
+_SWAP_LOCK_KEY = 0x63617431  # pg_advisory_xact_lock: не более одного переключения одновременно
+_PRICE_TYPE = Numeric(12, 2)  # типизированный параметр: драйверы без Decimal (SQLite) получат float
+
+_HISTORY_COLUMNS = ("ident", "category", "price_value", "prev_value", "currency", "observed_at")
 
 def slugify(name: str) -> str:
     s = name.lower()
@@ -16,60 +34,287 @@ def slugify(name: str) -> str:
 def table_name_for_category(cat_name: str) -> str:
     return f"{PRODUCTS_PREFIX}{slugify(cat_name)}"
 
-async def list_existing_category_tables(session: AsyncSession) -> List[str]:
+def pretty_cat_from_table(t: str) -> str:
+    return t[len(PRODUCTS_PREFIX):].replace("_", " ").title()
+
+def _qn(table_name: str, schema: str | None = None) -> str:
+    return f'"{schema}"."{table_name}"' if schema else f'"{table_name}"'
+
+def product_ident(item: Dict) -> str:
+    """Стабильный ключ товара: по URL, а если его нет — по названию."""
+    url = (item.get("url") or "").strip()
+    key = f"url:{url}" if url else f"title:{(item.get('title') or '').strip().lower()}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+@dataclass
+class SyncStats:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    unpriced: int = 0  # товаров, чью цену не удалось разобрать в число
+    price_changes: int = 0  # строк, добавленных в price_history
+
+    def __str__(self) -> str:
+        s = (f"добавлено={self.inserted} обновлено={self.updated} "
+             f"удалено={self.deleted} без изменений={self.unchanged}")
+        s += f" без числовой цены={self.unpriced}" if self.unpriced else ""
+        return s + (f" в историю цен={self.price_changes}" if self.price_changes else "")
+
+async def list_existing_category_tables(session: AsyncSession, schema: str = "public") -> List[str]:
     dialect = session.bind.dialect.name
     if "mysql" in dialect:
         q = text("SHOW TABLES")
         res: CursorResult = await session.execute(q)
         rows = [r[0] for r in res.fetchall() if r[0].startswith(PRODUCTS_PREFIX)]
         return rows
+    elif dialect == "sqlite":
+        # у SQLite нет схем: каталог только в основной БД (режим swap там недоступен)
+        if schema != "public":
+            return []
+        res = await session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"),
+            {"prefix": f"{PRODUCTS_PREFIX}%"},
+        )
+        return [r[0] for r in res.fetchall()]
     else:
         q = text("""
             SELECT tablename FROM pg_tables
-            WHERE schemaname = 'public' AND tablename LIKE :prefix
+            WHERE schemaname = :schema AND tablename LIKE :prefix
         """)
-        res = await session.execute(q, {"prefix": f"{PRODUCTS_PREFIX}%"})
+        res = await session.execute(q, {"schema": schema, "prefix": f"{PRODUCTS_PREFIX}%"})
         return [r[0] for r in res.fetchall()]
 
+async def latest_per_category(session: AsyncSession, tables: List[str], limit: int = 5) -> Dict[str, List[tuple]]:
+    """Последние `limit` товаров каждой категории за один запрос (UNION ALL по таблицам).
+
+    Каждая ветка читает хвост своей таблицы по первичному ключу, так что
+    время ответа не растёт с числом категорий на стороне клиента.
+    Результат: {таблица: [(title, price, url), …]} в порядке id DESC.
+    """
+    if not tables:
+        return {}
+    parts = [
+        f'SELECT * FROM (SELECT :t{i} AS tbl, id, title, price, url FROM "{t}" ORDER BY id DESC LIMIT :lim) AS s{i}'
+        for i, t in enumerate(tables)
+    ]
+    params = {f"t{i}": t for i, t in enumerate(tables)}
+    params["lim"] = limit
+    res = await session.execute(text(" UNION ALL ".join(parts)), params)
+    # UNION ALL не гарантирует порядок строк — сортируем по id на месте
+    out: Dict[str, List[tuple]] = {t: [] for t in tables}
+    for tbl, id_, title, price, url in sorted(res.fetchall(), key=lambda r: r[1], reverse=True):
+        out[tbl].append((title, price, url))
+    return out
+
+async def category_page(session: AsyncSession, table_name: str, before_id: int | None = None,
+                        after_id: int | None = None, limit: int = 10) -> List[tuple]:
+    """Страница категории по ключу id, без OFFSET: [(id, title, price, url)] в порядке id DESC.
+
+    before_id — товары старше (id < before_id), с начала — без курсоров;
+    after_id — ближайшие более новые (id > after_id), для перехода назад.
+    Оба варианта читают индекс первичного ключа с нужного места, поэтому
+    глубокие страницы не дороже первой.
+    """
+    if after_id is not None:
+        res = await session.execute(text(f"""
+            SELECT id, title, price, url FROM "{table_name}" WHERE id > :after ORDER BY id LIMIT :lim
+        """), {"after": after_id, "lim": limit})
+        return [tuple(r) for r in reversed(res.fetchall())]
+    where = "WHERE id < :before" if before_id is not None else ""
+    res = await session.execute(text(f"""
+        SELECT id, title, price, url FROM "{table_name}" {where} ORDER BY id DESC LIMIT :lim
+    """), {"before": before_id, "lim": limit} if before_id is not None else {"lim": limit})
+    return [tuple(r) for r in res.fetchall()]
+
+async def count_products(session: AsyncSession, table_name: str) -> int:
+    return (await session.execute(text(f'SELECT COUNT(*) FROM "{table_name}"'))).scalar_one()
+
+async def cheapest(session: AsyncSession, table_name: str, limit: int = 5) -> List[tuple]:
+    """Самые дешёвые товары категории: [(title, price, url)] по возрастанию цены."""
+    res = await session.execute(text(f"""
+        SELECT title, price, url FROM "{table_name}"
+        WHERE price_value IS NOT NULL ORDER BY price_value, id LIMIT :lim
+    """), {"lim": limit})
+    return [tuple(r) for r in res.fetchall()]
+
+async def in_price_range(session: AsyncSession, table_name: str, low: Decimal, high: Decimal,
+                         limit: int = 20) -> List[tuple]:
+    res = await session.execute(text(f"""
+        SELECT title, price, url FROM "{table_name}"
+        WHERE price_value BETWEEN :lo AND :hi ORDER BY price_value, id LIMIT :lim
+    """).bindparams(bindparam("lo", type_=_PRICE_TYPE), bindparam("hi", type_=_PRICE_TYPE)),
+        {"lo": low, "hi": high, "lim": limit})
+    return [tuple(r) for r in res.fetchall()]
+
+async def under_price(session: AsyncSession, table_name: str, max_price: Decimal, limit: int = 20) -> List[tuple]:
+    """Товары не дороже max_price, начиная с самых дорогих — ближайших к бюджету."""
+    res = await session.execute(text(f"""
+        SELECT title, price, url FROM "{table_name}"
+        WHERE price_value <= :hi ORDER BY price_value DESC, id DESC LIMIT :lim
+    """).bindparams(bindparam("hi", type_=_PRICE_TYPE)), {"hi": max_price, "lim": limit})
+    return [tuple(r) for r in res.fetchall()]
+
 async def drop_table(session: AsyncSession, table_name: str):
     await session.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
     await session.commit()
 
-async def ensure_category_table(session: AsyncSession, table_name: str):
+async def _table_columns(session: AsyncSession, table_name: str, schema: str | None = None) -> set[str]:
+    if session.bind.dialect.name == "sqlite":
+        res = await session.execute(text(f"PRAGMA table_info({_qn(table_name, schema)})"))
+        return {r[1] for r in res.fetchall()}
+    res = await session.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = COALESCE(:schema, current_schema()) AND table_name = :t"
+    ), {"schema": schema, "t": table_name})
+    return {r[0] for r in res.fetchall()}
+
+async def _add_columns(session: AsyncSession, table_name: str, schema: str | None, columns: Dict[str, str]):
+    # ALTER TABLE в PostgreSQL берёт эксклюзивную блокировку даже с IF NOT EXISTS — только для недостающих колонок
+    have = await _table_columns(session, table_name, schema)
+    for name, ddl in columns.items():
+        if name not in have:
+            await session.execute(text(f"ALTER TABLE {_qn(table_name, schema)} ADD COLUMN {name} {ddl}"))
+
+async def _create_category_table(session: AsyncSession, table_name: str, schema: str | None = None):
+    qn = _qn(table_name, schema)
+    id_col = "INTEGER PRIMARY KEY AUTOINCREMENT" if session.bind.dialect.name == "sqlite" else "SERIAL PRIMARY KEY"
     await session.execute(text(f"""
-        CREATE TABLE IF NOT EXISTS "{table_name}" (
-            id SERIAL PRIMARY KEY,
+        CREATE TABLE IF NOT EXISTS {qn} (
+            id {id_col},
+            ident VARCHAR(64) NULL,
             title VARCHAR(255) NOT NULL,
             price VARCHAR(64) NOT NULL,
+            price_value NUMERIC(12, 2) NULL,
+            currency VARCHAR(8) NULL,
             url TEXT NULL,
             updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
         )
     """))
-    await session.execute(text(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_title" ON "{table_name}"(title)'))
+    # таблицы, созданные до появления ident и числовой цены
+    await _add_columns(session, table_name, schema, {
+        "ident": "VARCHAR(64) NULL", "price_value": "NUMERIC(12, 2) NULL", "currency": "VARCHAR(8) NULL",
+    })
+    await session.execute(text(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_title" ON {qn}(title)'))
+    await session.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table_name}_ident" ON {qn}(ident)'))
+    # (price_value, id): выборки «дешевле X», «от–до» и «самые дешёвые» — сканы диапазона по индексу
+    await session.execute(text(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_price" ON {qn}(price_value, id)'))
+
+async def ensure_category_table(session: AsyncSession, table_name: str):
+    await _create_category_table(session, table_name)
     await session.commit()
 
 async def truncate_table(session: AsyncSession, table_name: str):
-    await session.execute(text(f'TRUNCATE TABLE "{table_name}"'))
+    verb = "DELETE FROM" if session.bind.dialect.name == "sqlite" else "TRUNCATE TABLE"
+    await session.execute(text(f'{verb} "{table_name}"'))
     await session.commit()
 
-async def bulk_insert_products(session: AsyncSession, table_name: str, items: List[Dict]):
-    if not items:
+PRODUCT_COLUMNS = ("ident", "title", "price", "price_value", "currency", "url", "updated_at")
+_PRICE_VALUE = PRODUCT_COLUMNS.index("price_value")
+_VALUES_CHUNK_PARAMS = 900  # укладываемся в старый лимит SQLite в 999 параметров на запрос
+
+def product_values(item: Dict) -> tuple:
+    """(title, price, price_value, currency, url): цена нормализуется в число при записи."""
+    price = item.get("price") or ""
+    value, currency = parse_price(price)
+    return item.get("title") or "", price, value, currency, item.get("url")
+
+def product_rows(items: List[Dict], ts: datetime | None = None) -> List[tuple]:
+    """Строки в порядке PRODUCT_COLUMNS; одна метка времени на всю порцию.
+
+    ident в таблице категории уникален, поэтому повтор товара в порции
+    пропускается (остаётся первое вхождение).
+    """
+    ts = ts or datetime.utcnow()
+    rows: Dict[str, tuple] = {}
+    for it in items:
+        ident = product_ident(it)
+        if ident not in rows:
+            rows[ident] = (ident, *product_values(it), ts)
+    return list(rows.values())
+
+def _same_price(a, b) -> bool:
+    # NUMERIC из SQLite приходит float'ом — сравниваем с точностью до копейки
+    if a is None or b is None:
+        return a is b
+    return Decimal(str(a)).quantize(Decimal("0.01")) == Decimal(str(b)).quantize(Decimal("0.01"))
+
+async def copy_rows(session: AsyncSession, table_name: str, columns: tuple, rows: List[tuple],
+                    schema: str | None = None):
+    """Массовая загрузка в текущей транзакции сессии.
+
+    В PostgreSQL с asyncpg — бинарный COPY (copy_records_to_table), на
+    остальных СУБД — многострочные INSERT … VALUES порциями.
+    """
+    if not rows:
         return
-    values = [
-        {
-            "title": it.get("title") or "",
-            "price": it.get("price") or "",
-            "url": it.get("url"),
-            "updated_at": datetime.utcnow()
-        } for it in items
-    ]
-    await session.execute(
-        text(f"""
-            INSERT INTO "{table_name}" (title, price, url, updated_at)
-            VALUES (:title, :price, :url, :updated_at)
-        """),
-        values
+    conn = await session.connection()
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "asyncpg":
+        raw = (await conn.get_raw_connection()).driver_connection
+        if not raw.is_in_transaction():
+            # адаптер asyncpg в SQLAlchemy открывает транзакцию лениво, на первом запросе
+            await conn.exec_driver_sql("SELECT 1")
+        await raw.copy_records_to_table(table_name, records=rows, columns=list(columns), schema_name=schema)
+        return
+
+    if not conn.dialect.supports_native_decimal:
+        rows = [tuple(float(v) if isinstance(v, Decimal) else v for v in row) for row in rows]
+    qn = _qn(table_name, schema)
+    cols = ", ".join(columns)
+    chunk = max(1, _VALUES_CHUNK_PARAMS // len(columns))
+    stmts: Dict[int, object] = {}
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        stmt = stmts.get(len(part))
+        if stmt is None:
+            groups = ", ".join(
+                "(" + ", ".join(f":p{r}_{c}" for c in range(len(columns))) + ")" for r in range(len(part))
+            )
+            stmt = stmts[len(part)] = text(f"INSERT INTO {qn} ({cols}) VALUES {groups}")
+        params = {f"p{r}_{c}": v for r, row in enumerate(part) for c, v in enumerate(row)}
+        await session.execute(stmt, params)
+
+async def record_price_changes(session: AsyncSession, category: str, prices: List[tuple]) -> int:
+    """Дописывает в price_history товары, чья цена отличается от последней известной.
+
+    prices — (ident, price_value, currency); товары без числовой цены пропускаются.
+    Последние цены порции читаются одним запросом по индексу (ident, id).
+    """
+    latest_by_ident = {ident: (value, currency) for ident, value, currency in prices if value is not None}
+    if not latest_by_ident:
+        return 0
+    h = PriceHistory.__table__
+    res = await session.execute(
+        text(f'SELECT ident, price_value FROM "{h.name}" WHERE id IN '
+             f'(SELECT MAX(id) FROM "{h.name}" WHERE ident IN :idents GROUP BY ident)')
+        .bindparams(bindparam("idents", expanding=True)),
+        {"idents": list(latest_by_ident)},
     )
+    known = dict(res.fetchall())
+    now = datetime.utcnow()
+    rows = [(ident, category, value, known.get(ident), currency, now)
+            for ident, (value, currency) in latest_by_ident.items()
+            if ident not in known or not _same_price(known[ident], value)]
+    await copy_rows(session, h.name, _HISTORY_COLUMNS, rows)
+    return len(rows)
+
+async def _insert_products(session: AsyncSession, table_name: str, items: List[Dict], schema: str | None = None) -> List[tuple]:
+    rows = product_rows(items)
+    if rows:
+        # товар, уже записанный прошлой порцией этой категории, второй раз не вставляем
+        res = await session.execute(
+            text(f'SELECT ident FROM {_qn(table_name, schema)} WHERE ident IN :idents')
+            .bindparams(bindparam("idents", expanding=True)),
+            {"idents": [r[0] for r in rows]},
+        )
+        existing = set(res.scalars())
+        if existing:
+            rows = [r for r in rows if r[0] not in existing]
+    await copy_rows(session, table_name, PRODUCT_COLUMNS, rows, schema)
+    return rows
+
+async def bulk_insert_products(session: AsyncSession, table_name: str, items: List[Dict]):
+    await _insert_products(session, table_name, items)
     await session.commit()
 
 async def replace_all_categories_and_products(session: AsyncSession, categorized_items: Dict[str, List[Dict]]):
@@ -84,3 +329,246 @@ async def replace_all_categories_and_products(session: AsyncSession, categorized
         await ensure_category_table(session, tname)
         await truncate_table(session, tname)
         await bulk_insert_products(session, tname, items)
+
+async def _move_tables(session: AsyncSession, tables: List[str], src: str, dst: str):
+    for t in tables:
+        await session.execute(text(f'ALTER TABLE {_qn(t, src)} SET SCHEMA "{dst}"'))
+
+class CatalogWriter:
+    """Запись каталога порциями: begin() → write(категория, товары)… → finish().
+
+    Порции одной категории могут приходить многократно и вперемешку с другими,
+    поэтому каталог пишется по мере парсинга, не собираясь целиком в памяти.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.stats = SyncStats()
+        self.tables: set[str] = set()
+
+    async def begin(self):
+        pass
+
+    async def write(self, cat_name: str, items: List[Dict]):
+        raise NotImplementedError
+
+    async def finish(self) -> SyncStats:
+        raise NotImplementedError
+
+    async def abort(self):
+        await self.session.rollback()
+
+    async def _record_prices(self, tname: str, rows: List[tuple]):
+        """rows — строки в порядке PRODUCT_COLUMNS."""
+        i_value, i_currency = _PRICE_VALUE, PRODUCT_COLUMNS.index("currency")
+        self.stats.price_changes += await record_price_changes(
+            self.session, tname, [(r[0], r[i_value], r[i_currency]) for r in rows])
+
+    def _track_unpriced(self, titles_prices: List[tuple]):
+        """Учёт товаров с ценой, не разобранной в число: счётчик прогона и метрика процесса."""
+        bad = [(t, p) for t, p in titles_prices if p]
+        if not bad:
+            return
+        if not self.stats.unpriced:
+            log.warning("Цена не разобрана в число, например: %r → %r", *bad[0])
+        self.stats.unpriced += len(bad)
+        metrics.inc("shopbot_price_parse_failures_total", len(bad))
+
+class ReplaceWriter(CatalogWriter):
+    """Старый режим: TRUNCATE при первой порции категории и дозапись остальных."""
+
+    async def write(self, cat_name: str, items: List[Dict]):
+        tname = table_name_for_category(cat_name)
+        if tname not in self.tables:
+            self.tables.add(tname)
+            await ensure_category_table(self.session, tname)
+            await truncate_table(self.session, tname)
+        rows = await _insert_products(self.session, tname, items)
+        await self._record_prices(tname, rows)
+        await self.session.commit()
+        self._track_unpriced([(r[1], r[2]) for r in rows if r[_PRICE_VALUE] is None])
+        self.stats.inserted += len(rows)
+
+    async def finish(self) -> SyncStats:
+        for t in set(await list_existing_category_tables(self.session)) - self.tables:
+            await drop_table(self.session, t)
+        return self.stats
+
+class SyncWriter(CatalogWriter):
+    """Инкрементальная синхронизация: меняются только новые, изменённые и исчезнувшие товары.
+
+    Каждая порция сравнивается со строками таблицы по ident и сразу
+    коммитится: новые вставляются, изменившиеся обновляются, неизменные не
+    трогаются. Таблицы создаются отдельной короткой транзакцией, так что
+    блокировки таблиц каталога не держатся весь парсинг. Увиденные ident
+    складываются в служебную таблицу, по ней в finish() одной транзакцией
+    удаляются исчезнувшие товары — память не растёт с размером каталога.
+    Прерванный прогон оставляет записанные порции, но ничего не удаляет.
+    """
+
+    SEEN = "_seen_idents"
+
+    async def begin(self):
+        # не временная таблица: после коммита порции сессия может получить другое соединение из пула
+        await self.session.execute(text(f'CREATE TABLE IF NOT EXISTS "{self.SEEN}" (tbl VARCHAR(128) NOT NULL, ident VARCHAR(64) NOT NULL)'))
+        await self.session.execute(text(f'CREATE INDEX IF NOT EXISTS "idx_{self.SEEN}" ON "{self.SEEN}"(tbl, ident)'))
+        await self.session.execute(text(f'DELETE FROM "{self.SEEN}"'))
+        await self.session.commit()
+
+    async def write(self, cat_name: str, items: List[Dict]):
+        tname = table_name_for_category(cat_name)
+        if tname not in self.tables:
+            self.tables.add(tname)
+            await ensure_category_table(self.session, tname)  # DDL — своя транзакция, до записи товаров
+
+        wanted: Dict[str, tuple] = {}
+        for it in items:
+            wanted[product_ident(it)] = product_values(it)
+        if not wanted:
+            return
+        self._track_unpriced([(v[0], v[1]) for v in wanted.values() if v[2] is None])
+
+        res = await self.session.execute(
+            text(f'SELECT ident, title, price, price_value, url FROM "{tname}" WHERE ident IN :idents')
+            .bindparams(bindparam("idents", expanding=True)),
+            {"idents": list(wanted)},
+        )
+        current = {r[0]: tuple(r[1:]) for r in res.fetchall()}
+
+        now = datetime.utcnow()
+        to_insert, to_update = [], []
+        for ident, (title, price, value, currency, url) in wanted.items():
+            old = current.get(ident)
+            if old is None:
+                to_insert.append((ident, title, price, value, currency, url, now))
+            elif old[0] != title or old[1] != price or old[3] != url or not _same_price(old[2], value):
+                # строки без price_value (записанные до нормализации) тоже попадают сюда и дозаполняются
+                to_update.append({"ident": ident, "title": title, "price": price, "price_value": value,
+                                  "currency": currency, "url": url, "updated_at": now})
+            else:
+                self.stats.unchanged += 1
+
+        await copy_rows(self.session, tname, PRODUCT_COLUMNS, to_insert)
+        if to_update:
+            await self.session.execute(text(f"""
+                UPDATE "{tname}" SET title = :title, price = :price, price_value = :price_value,
+                    currency = :currency, url = :url, updated_at = :updated_at
+                WHERE ident = :ident
+            """).bindparams(bindparam("price_value", type_=_PRICE_TYPE)), to_update)
+        await copy_rows(self.session, self.SEEN, ("tbl", "ident"), [(tname, i) for i in wanted])
+        # сверяем всю порцию, а не только изменённые строки: товары, записанные до появления истории, получат в ней первую цену
+        self.stats.price_changes += await record_price_changes(
+            self.session, tname, [(ident, v[2], v[3]) for ident, v in wanted.items()])
+        await self.session.commit()
+        self.stats.inserted += len(to_insert)
+        self.stats.updated += len(to_update)
+
+    async def finish(self) -> SyncStats:
+        s = self.session
+        for t in set(await list_existing_category_tables(s)) - self.tables:
+            res = await s.execute(text(f'SELECT COUNT(*) FROM "{t}"'))
+            self.stats.deleted += res.scalar_one()
+            await s.execute(text(f'DROP TABLE IF EXISTS "{t}"'))
+        for t in self.tables:
+            # исчезнувшие товары и строки без ident, оставшиеся от полной замены
+            res = await s.execute(text(f"""
+                DELETE FROM "{t}" WHERE ident IS NULL OR NOT EXISTS (
+                    SELECT 1 FROM "{self.SEEN}" seen WHERE seen.tbl = :tbl AND seen.ident = "{t}".ident
+                )
+            """), {"tbl": t})
+            self.stats.deleted += max(res.rowcount or 0, 0)
+        await s.execute(text(f'DELETE FROM "{self.SEEN}"'))
+        await s.commit()
+        return self.stats
+
+class SwapWriter(CatalogWriter):
+    """Публикация без простоя: каталог собирается в теневой схеме и подменяется одной транзакцией.
+
+    Читатели видят либо старую, либо новую версию целиком; старая версия
+    остаётся в схеме PREV_SCHEMA для rollback_catalog(). Переключение схем
+    есть только в PostgreSQL (см. make_catalog_writer).
+    """
+
+    async def begin(self):
+        # сборка идёт вне public, читатели её не видят
+        await self.session.execute(text(f'DROP SCHEMA IF EXISTS "{SHADOW_SCHEMA}" CASCADE'))
+        await self.session.execute(text(f'CREATE SCHEMA "{SHADOW_SCHEMA}"'))
+        await self.session.commit()
+
+    async def write(self, cat_name: str, items: List[Dict]):
+        tname = table_name_for_category(cat_name)
+        if tname not in self.tables:
+            self.tables.add(tname)
+            await _create_category_table(self.session, tname, SHADOW_SCHEMA)
+        rows = await _insert_products(self.session, tname, items, SHADOW_SCHEMA)
+        await self._record_prices(tname, rows)
+        await self.session.commit()
+        self._track_unpriced([(r[1], r[2]) for r in rows if r[_PRICE_VALUE] is None])
+        self.stats.inserted += len(rows)
+
+    async def finish(self) -> SyncStats:
+        s = self.session
+        # переключение — одна транзакция
+        await s.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _SWAP_LOCK_KEY})
+        live = await list_existing_category_tables(s)
+        await s.execute(text(f'DROP SCHEMA IF EXISTS "{PREV_SCHEMA}" CASCADE'))
+        await s.execute(text(f'CREATE SCHEMA "{PREV_SCHEMA}"'))
+        await _move_tables(s, live, "public", PREV_SCHEMA)
+        await _move_tables(s, sorted(self.tables), SHADOW_SCHEMA, "public")
+        await s.execute(text(f'DROP SCHEMA "{SHADOW_SCHEMA}" CASCADE'))
+        await s.commit()
+        return self.stats
+
+def make_catalog_writer(session: AsyncSession, mode: str = "sync") -> CatalogWriter:
+    if mode == "replace":
+        return ReplaceWriter(session)
+    if mode == "sync":
+        return SyncWriter(session)
+    if mode == "swap":
+        # переключение схем есть только в PostgreSQL, на других СУБД — sync
+        if session.bind.dialect.name != "postgresql":
+            return SyncWriter(session)
+        return SwapWriter(session)
+    raise ValueError(f"Неизвестный режим записи каталога: {mode}")
+
+async def _write_all(writer: CatalogWriter, categorized_items: Dict[str, List[Dict]]) -> SyncStats:
+    try:
+        await writer.begin()
+        for cat_name, items in categorized_items.items():
+            await writer.write(cat_name, items)
+        return await writer.finish()
+    except Exception:
+        await writer.abort()
+        raise
+
+async def sync_all_categories_and_products(session: AsyncSession, categorized_items: Dict[str, List[Dict]]) -> SyncStats:
+    return await _write_all(SyncWriter(session), categorized_items)
+
+async def swap_publish_catalog(session: AsyncSession, categorized_items: Dict[str, List[Dict]]) -> SyncStats:
+    return await _write_all(make_catalog_writer(session, "swap"), categorized_items)
+
+async def rollback_catalog(session: AsyncSession) -> bool:
+    """Возвращает предыдущую версию каталога; текущая становится «предыдущей» (повторный вызов — откат отката)."""
+    if session.bind.dialect.name != "postgresql":
+        return False
+    try:
+        await session.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _SWAP_LOCK_KEY})
+        prev = await list_existing_category_tables(session, PREV_SCHEMA)
+        if not prev:
+            await session.rollback()
+            return False
+        live = await list_existing_category_tables(session)
+        await session.execute(text(f'DROP SCHEMA IF EXISTS "{SHADOW_SCHEMA}" CASCADE'))
+        await session.execute(text(f'CREATE SCHEMA "{SHADOW_SCHEMA}"'))
+        await _move_tables(session, live, "public", SHADOW_SCHEMA)
+        await _move_tables(session, prev, PREV_SCHEMA, "public")
+        await session.execute(text(f'DROP SCHEMA "{PREV_SCHEMA}"'))
+        await session.execute(text(f'ALTER SCHEMA "{SHADOW_SCHEMA}" RENAME TO "{PREV_SCHEMA}"'))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return True
+
+async def publish_catalog(session: AsyncSession, categorized_items: Dict[str, List[Dict]], mode: str = "sync") -> SyncStats:
+    return await _write_all(make_catalog_writer(session, mode), categorized_items)
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+import aiohttp
+
+from .page_cache import PageCache
+
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
+
+@dataclass
+class FetchResult:
+    url: str
+    text: str
+    sha256: str
+    unchanged: bool = False  # 304 или тот же хеш, что в кэше: разбор можно взять из кэша
+
+class Fetcher:
+    """Общий пул HTTP-соединений на весь прогон парсинга.
+
+    Параллелизм ограничивается коннектором: `concurrency` соединений всего
+    и `per_host` на один хост, остальные запросы ждут в очереди пула.
+    С `cache` запросы становятся условными (If-None-Match / If-Modified-Since).
+    """
+
+    def __init__(self, concurrency: int = 8, per_host: int = 4, timeout: float = 25.0,
+                 cache: PageCache | None = None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache = cache
+        self.not_modified = 0
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "Fetcher":
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": UA},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.save)
+
+    async def get_text(self, url: str) -> str:
+        return (await self.fetch(url)).text
+
+    async def fetch(self, url: str, conditional: bool = True) -> FetchResult:
+        if self._session is None:
+            raise RuntimeError("Fetcher не открыт (используйте async with)")
+        entry = self.cache.lookup(url) if self.cache is not None and conditional else None
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        async with self._session.get(url, headers=headers) as r:
+            not_modified = r.status == 304 and entry is not None
+            if not not_modified:
+                r.raise_for_status()
+                text = await r.text()
+                etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+
+        # соединение уже возвращено в пул: повторный запрос не ждёт второго слота на хост
+        if not_modified:
+            body = await asyncio.to_thread(self.cache.read_body, url)
+            if body is None:  # тело вытеснено из кэша — качаем заново без условий
+                return await self.fetch(url, conditional=False)
+            self.not_modified += 1
+            return FetchResult(url, body, entry.sha256, unchanged=True)
+
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.cache is None:
+            return FetchResult(url, text, digest)
+        unchanged = entry is not None and entry.sha256 == digest
+        await asyncio.to_thread(self.cache.store, url, text, digest, etag, last_modified)
+        return FetchResult(url, text, digest, unchanged=unchanged)
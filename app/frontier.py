@@ -0,0 +1,105 @@
+import hashlib
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# метки рекламных кампаний не меняют содержимое страницы
+_TRACKING_RX = re.compile(r"^(utm_\w+|gclid|fbclid|yclid|_openstat|roistat)$", re.I)
+# «?page=1» — та же первая страница, что и адрес раздела без параметров
+_FIRST_PAGE_PARAMS = {"page", "pagen_1"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonical_url(url: str) -> str:
+    """Адрес, под которым одна и та же страница встречается один раз.
+
+    Схема и хост в нижнем регистре, без порта по умолчанию и якоря;
+    параметры отсортированы, метки кампаний и номер первой страницы убраны.
+    """
+    parts = urlsplit(url.strip())
+    scheme, host = parts.scheme.lower(), (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not _TRACKING_RX.match(k) and not (k.lower() in _FIRST_PAGE_PARAMS and v in ("", "1")))
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+@dataclass
+class CrawlStats:
+    pages: int = 0
+    duplicate_pages: int = 0   # ссылок, которые вели на уже взятую страницу под другим адресом
+    items: int = 0
+    duplicate_items: int = 0   # товаров, уже встреченных на других страницах или разделах
+
+    def __str__(self) -> str:
+        return (f"страниц={self.pages} (повторных ссылок {self.duplicate_pages}) "
+                f"товаров={self.items} (дублей {self.duplicate_items})")
+
+class CrawlFrontier:
+    """Очередь обхода раздела: FIFO и множество уже поставленных канонических адресов.
+
+    seen можно разделить между разделами одного прогона — тогда страница,
+    на которую ведут два настроенных URL, качается один раз.
+    """
+
+    def __init__(self, seen: set | None = None, stats: CrawlStats | None = None):
+        self._queue: deque[str] = deque()
+        self._raw: set[str] = set()  # адреса как в ссылках: их повторы — обычное дело, не считаем
+        self.seen = seen if seen is not None else set()
+        self.stats = stats if stats is not None else CrawlStats()
+
+    def add(self, url: str) -> bool:
+        if url in self._raw:
+            return False
+        self._raw.add(url)
+        canon = canonical_url(url)
+        if canon in self.seen:
+            self.stats.duplicate_pages += 1
+            return False
+        self.seen.add(canon)
+        self._queue.append(canon)
+        return True
+
+    def extend(self, urls: Iterable[str]):
+        for u in urls:
+            self.add(u)
+
+    def pop(self) -> str:
+        return self._queue.popleft()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+class ItemDeduper:
+    """Отбрасывает товары, уже отданные в этом прогоне.
+
+    Ключ — канонический URL карточки, а без него — название и цена.
+    Хранятся 16-байтные хеши, чтобы память не росла с длиной адресов.
+    """
+
+    def __init__(self, stats: CrawlStats | None = None):
+        self._seen: set[bytes] = set()
+        self.stats = stats if stats is not None else CrawlStats()
+
+    @staticmethod
+    def key(item: Dict) -> bytes:
+        url = (item.get("url") or "").strip()
+        if url:
+            raw = "u:" + canonical_url(url)
+        else:
+            title = " ".join((item.get("title") or "").lower().split())
+            raw = f"t:{title}\x00{' '.join((item.get('price') or '').split())}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+    def filter(self, items: List[Dict]) -> List[Dict]:
+        out = []
+        for it in items:
+            k = self.key(it)
+            if k in self._seen:
+                self.stats.duplicate_items += 1
+                continue
+            self._seen.add(k)
+            out.append(it)
+        self.stats.items += len(out)
+        return out
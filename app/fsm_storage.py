@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .config import FsmConf
+from .models import FsmRecord
+
+log = logging.getLogger(__name__)
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+_NOTIFY_CHANNEL = "fsm_states"
+_NOTIFY_MAX = 7000  # лимит payload у NOTIFY — 8000 байт
+
+@dataclass
+class _Record:
+    state: str | None = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0   # time.time() последнего изменения — для TTL брошенных состояний
+    loaded_at: float = 0.0    # time.monotonic() чтения из БД — для свежести кэша
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+def _key(key: StorageKey) -> str:
+    return ":".join(str(p) if p is not None else "" for p in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny))
+
+class SqlStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states с кэшем в процессе и отложенной записью.
+
+    Чтения обслуживаются из кэша, пока запись моложе cache_ttl; изменения
+    копятся и раз в flush_interval пишутся одним upsert'ом (пустые состояния —
+    удалением). Состояния, не менявшиеся дольше state_ttl, считаются
+    брошенными: читаются как пустые и периодически вычищаются из таблицы.
+
+    На PostgreSQL (asyncpg) после записи рассылается NOTIFY с ключами, и
+    остальные процессы бота сбрасывают их в своих кэшах, поэтому кэш можно
+    держать долго. На других БД процессы видят чужие изменения не позже,
+    чем через cache_ttl; для нескольких процессов без PostgreSQL ставьте 0.
+    """
+
+    def __init__(self, Session: async_sessionmaker[AsyncSession], cache_ttl: float = 300.0,
+                 flush_interval: float = 0.5, state_ttl: float = 86400.0, sweep_interval: float = 600.0,
+                 max_cached: int = 10000, engine: AsyncEngine | None = None):
+        self.Session = Session
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.sweep_interval = sweep_interval
+        self.max_cached = max_cached
+        self._engine = engine  # собственный движок (локальный SQLite) закрываем сами
+        self._cache: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self._listen_conn: AsyncConnection | None = None
+        self._origin = f"{os.getpid()}-{id(self)}"  # свои NOTIFY узнаём по этой метке
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+        self.expired = 0
+
+    async def start(self):
+        if self._task is not None:
+            return
+        if self._engine is not None:
+            async with self._engine.begin() as conn:
+                await conn.run_sync(FsmRecord.__table__.create, checkfirst=True)
+        await self._listen()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._listen_conn is not None:
+            await self._listen_conn.close()
+            self._listen_conn = None
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k, rec = await self._get(key)
+        rec.state = state.state if isinstance(state, State) else state
+        await self._touch(k, rec)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._get(key))[1].state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        k, rec = await self._get(key)
+        rec.data = data.copy()
+        await self._touch(k, rec)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key))[1].data.copy()
+
+    # --- кэш ---
+
+    async def _get(self, key: StorageKey) -> tuple[str, _Record]:
+        k = _key(key)
+        rec = self._cache.get(k)
+        if rec is not None and (k in self._dirty or time.monotonic() - rec.loaded_at < self.cache_ttl):
+            self.hits += 1
+            self._cache.move_to_end(k)
+        else:
+            self.misses += 1
+            rec = await self._load(k)
+            if k in self._dirty:  # пока читали, запись изменили в другой корутине — она новее
+                rec = self._cache[k]
+            self._remember(k, rec)
+        if not rec.empty and time.time() - rec.updated_at > self.state_ttl:
+            # состояние брошено: пользователь так и не ответил — начинаем с чистого листа
+            self.expired += 1
+            rec.state, rec.data = None, {}
+            self._dirty.add(k)
+        return k, rec
+
+    async def _load(self, k: str) -> _Record:
+        async with self.Session() as s:
+            row = (await s.execute(select(FsmRecord.state, FsmRecord.data, FsmRecord.updated_at)
+                                   .where(FsmRecord.key == k))).one_or_none()
+        if row is None:
+            return _Record(loaded_at=time.monotonic())
+        return _Record(state=row.state, data=json.loads(row.data) if row.data else {},
+                       updated_at=_to_ts(row.updated_at), loaded_at=time.monotonic())
+
+    def _remember(self, k: str, rec: _Record):
+        self._cache[k] = rec
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.max_cached:
+            old = next(iter(self._cache))
+            if old in self._dirty:
+                break  # несохранённое не выбрасываем — уйдёт после flush
+            del self._cache[old]
+
+    async def _touch(self, k: str, rec: _Record):
+        rec.updated_at = time.time()
+        rec.loaded_at = time.monotonic()  # своя запись — самая свежая версия
+        self._dirty.add(k)
+        if self.flush_interval <= 0:
+            await self.flush()
+
+    # --- запись ---
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        recs = {k: self._cache[k] for k in keys if k in self._cache}
+        upserts = [{"key": k, "state": r.state, "data": json.dumps(r.data, ensure_ascii=False) if r.data else None,
+                    "updated_at": datetime.utcfromtimestamp(r.updated_at)} for k, r in recs.items() if not r.empty]
+        deletes = [k for k, r in recs.items() if r.empty]
+        try:
+            async with self.Session() as s:
+                if upserts:
+                    await self._upsert(s, upserts)
+                if deletes:
+                    await s.execute(delete(FsmRecord).where(FsmRecord.key.in_(deletes)))
+                if self._listen_conn is not None:
+                    await self._notify(s, list(recs))
+                await s.commit()
+        except Exception:
+            log.exception("Не удалось сохранить %s состояний FSM — повторим", len(keys))
+            self._dirty |= keys
+            return
+        self.flushed += len(recs)
+
+    async def _upsert(self, s: AsyncSession, rows: list[dict]):
+        insert = _UPSERT_DIALECTS.get(s.bind.dialect.name)
+        if insert is None:
+            for r in rows:
+                await s.merge(FsmRecord(**r))
+            return
+        stmt = insert(FsmRecord)
+        stmt = stmt.on_conflict_do_update(index_elements=[FsmRecord.key], set_={
+            "state": stmt.excluded.state, "data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at})
+        await s.execute(stmt, rows)
+
+    async def sweep(self) -> int:
+        """Удаляет брошенные состояния порциями, чтобы не держать долгую блокировку таблицы."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.state_ttl)
+        total = 0
+        while True:
+            async with self.Session() as s:
+                keys = (await s.execute(select(FsmRecord.key).where(FsmRecord.updated_at < cutoff).limit(1000))).scalars().all()
+                if not keys:
+                    return total
+                await s.execute(delete(FsmRecord).where(FsmRecord.key.in_(keys), FsmRecord.updated_at < cutoff))
+                await s.commit()
+            total += len(keys)
+
+    async def _run(self):
+        last_sweep = 0.0
+        while True:
+            await asyncio.sleep(self.flush_interval if self.flush_interval > 0 else 1.0)
+            await self.flush()
+            if time.monotonic() - last_sweep >= self.sweep_interval:
+                last_sweep = time.monotonic()
+                try:
+                    n = await self.sweep()
+                except Exception:
+                    log.exception("Не удалось вычистить старые состояния FSM")
+                else:
+                    if n:
+                        log.info("Удалено брошенных состояний FSM: %s", n)
+
+    # --- межпроцессная инвалидация (PostgreSQL) ---
+
+    async def _listen(self):
+        async with self.Session() as s:
+            engine = s.bind
+        if engine.dialect.name != "postgresql" or engine.dialect.driver != "asyncpg":
+            return
+        self._listen_conn = await engine.connect()
+        raw = await self._listen_conn.get_raw_connection()
+        await raw.driver_connection.add_listener(_NOTIFY_CHANNEL, self._on_notify)
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str):
+        origin, *keys = payload.split("\n")
+        if origin == self._origin:
+            return
+        for k in keys:
+            if k not in self._dirty:
+                self._cache.pop(k, None)
+
+    async def _notify(self, s: AsyncSession, keys: list[str]):
+        # NOTIFY доставляется после commit — другие процессы перечитают уже сохранённое
+        chunk: list[str] = []
+        for k in keys:
+            if chunk and sum(len(c) + 1 for c in chunk) + len(k) > _NOTIFY_MAX:
+                await s.execute(select(func.pg_notify(_NOTIFY_CHANNEL, "\n".join([self._origin, *chunk]))))
+                chunk = []
+            chunk.append(k)
+        if chunk:
+            await s.execute(select(func.pg_notify(_NOTIFY_CHANNEL, "\n".join([self._origin, *chunk]))))
+
+def _to_ts(dt: datetime | None) -> float:
+    if dt is None:
+        return 0.0
+    return (dt - datetime(1970, 1, 1)).total_seconds()
+
+def make_fsm_storage(conf: FsmConf, Session: async_sessionmaker[AsyncSession]) -> BaseStorage:
+    """memory — как раньше (в процессе); sql — таблица в основной БД; sqlite — локальный файл."""
+    if conf.backend == "memory":
+        return MemoryStorage()
+    kwargs = dict(cache_ttl=conf.cache_ttl, flush_interval=conf.flush_interval,
+                  state_ttl=conf.state_ttl, sweep_interval=conf.sweep_interval)
+    if conf.backend == "sql":
+        return SqlStorage(Session, **kwargs)
+    if conf.backend == "sqlite":
+        os.makedirs(os.path.dirname(conf.path) or ".", exist_ok=True)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{conf.path}")
+        return SqlStorage(async_sessionmaker(engine, expire_on_commit=False), engine=engine, **kwargs)
+    raise ValueError(f"Неизвестное FSM-хранилище: {conf.backend}")
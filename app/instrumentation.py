@@ -0,0 +1,178 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class UpdateBudget:
+    """Счётчики одного апдейта: запросы к БД, время в БД, открытые сессии."""
+    handler: str = "-"
+    statements: int = 0
+    db_time: float = 0.0
+    sessions: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+_budget: ContextVar[UpdateBudget | None] = ContextVar("update_budget", default=None)
+
+def current_budget() -> UpdateBudget | None:
+    return _budget.get()
+
+@dataclass
+class HandlerStats:
+    updates: int = 0
+    statements: int = 0
+    db_seconds: float = 0.0
+    seconds: float = 0.0
+    sessions: int = 0
+    slow: int = 0
+
+class Metrics:
+    """Агрегаты по хендлерам в памяти процесса; render() — текст в формате Prometheus."""
+
+    def __init__(self):
+        self.handlers: Dict[str, HandlerStats] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.counters: Dict[str, float] = {}
+
+    def observe(self, b: UpdateBudget, elapsed: float, slow: bool):
+        h = self.handlers.setdefault(b.handler, HandlerStats())
+        h.updates += 1
+        h.statements += b.statements
+        h.db_seconds += b.db_time
+        h.seconds += elapsed
+        h.sessions += b.sessions
+        h.slow += int(slow)
+
+    def inc(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self) -> str:
+        lines = []
+        series = [
+            ("shopbot_updates_total", "updates"), ("shopbot_db_statements_total", "statements"),
+            ("shopbot_db_seconds_total", "db_seconds"), ("shopbot_handler_seconds_total", "seconds"),
+            ("shopbot_db_sessions_total", "sessions"), ("shopbot_slow_updates_total", "slow"),
+        ]
+        for metric, attr in series:
+            lines.append(f"# TYPE {metric} counter")
+            for name, h in sorted(self.handlers.items()):
+                lines.append(f'{metric}{{handler="{name}"}} {getattr(h, attr)}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        for name, fn in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {fn()}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def install_query_hooks(engine: AsyncEngine):
+    """Считает запросы и время в БД в бюджет текущего апдейта (если он есть)."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        b = _budget.get()
+        if b is not None:
+            b.statements += 1
+            b.db_time += time.perf_counter() - started
+
+class LazySession:
+    """Прокси AsyncSession: настоящая сессия создаётся при первом обращении.
+
+    Апдейты, хендлеры которых не ходят в БД, сессию не открывают вовсе.
+    """
+
+    def __init__(self, factory: async_sessionmaker[AsyncSession]):
+        self._factory = factory
+        self._session: AsyncSession | None = None
+
+    @property
+    def created(self) -> bool:
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            b = _budget.get()
+            if b is not None:
+                b.sessions += 1
+        return self._session
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+class DbSessionMiddleware:
+    """Outer-middleware апдейтов: ленивая сессия и бюджет запросов.
+
+    Апдейты дольше slow_update_ms или с числом запросов больше
+    max_statements пишутся в лог как медленные.
+    """
+
+    def __init__(self, factory: async_sessionmaker[AsyncSession], slow_update_ms: float = 500,
+                 max_statements: int = 20):
+        self.factory = factory
+        self.slow_update = slow_update_ms / 1000
+        self.max_statements = max_statements
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        budget = UpdateBudget()
+        token = _budget.set(budget)
+        session = LazySession(self.factory)
+        data["session"] = session
+        try:
+            return await handler(event, data)
+        finally:
+            await session.close()
+            _budget.reset(token)
+            elapsed = time.perf_counter() - budget.started
+            slow = elapsed > self.slow_update or budget.statements > self.max_statements
+            metrics.observe(budget, elapsed, slow)
+            if slow:
+                log.warning("Медленный апдейт %s: хендлер=%s %.0fms, запросов=%d, в БД %.0fms",
+                            getattr(event, "update_id", "?"), budget.handler, elapsed * 1000,
+                            budget.statements, budget.db_time * 1000)
+
+class HandlerNameMiddleware:
+    """Inner-middleware: записывает в бюджет имя выбранного хендлера."""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        b = _budget.get()
+        h = data.get("handler")
+        if b is not None and h is not None:
+            b.handler = getattr(h.callback, "__name__", "?")
+        return await handler(event, data)
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """Отдаёт metrics.render() по HTTP GET /metrics; возвращает runner для остановки."""
+    from aiohttp import web
+
+    async def handle(_request):
+        return web.Response(text=metrics.render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import signal
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .models import Job, JobWaiter
+
+log = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+SCRAPE = "scrape"
+BROADCAST = "broadcast"
+DIGEST = "digest"      # дайджесты изменений цен после парсинга
+
+JobHandler = Callable[[Job], Awaitable[str]]
+
+def job_payload(job: Job) -> Dict[str, Any]:
+    return json.loads(job.payload) if job.payload else {}
+
+async def _active_job_id(s: AsyncSession, dedup_key: str) -> int | None:
+    res = await s.execute(select(Job.id).where(Job.dedup_key == dedup_key, Job.status.in_(ACTIVE)))
+    return res.scalar_one_or_none()
+
+async def enqueue_job(s: AsyncSession, kind: str, payload: Dict[str, Any] | None = None,
+                      dedup_key: str | None = None, chat_id: int | None = None) -> tuple[int, bool]:
+    """Ставит задачу в очередь; второй элемент — «присоединились к уже активной».
+
+    С dedup_key активная задача может быть только одна (частичный уникальный
+    индекс), поэтому одновременные запросы из разных процессов сходятся в ней.
+    chat_id получит сообщение о завершении.
+    """
+    job_id = await _active_job_id(s, dedup_key) if dedup_key else None
+    joined = job_id is not None
+    if job_id is None:
+        job = Job(kind=kind, dedup_key=dedup_key, status=QUEUED,
+                  payload=json.dumps(payload, ensure_ascii=False) if payload else None)
+        s.add(job)
+        try:
+            await s.flush()
+            job_id = job.id
+        except IntegrityError:
+            # другой процесс успел поставить такую же задачу
+            await s.rollback()
+            job_id = await _active_job_id(s, dedup_key)
+            joined = True
+            if job_id is None:  # и она уже успела завершиться — ставим заново
+                return await enqueue_job(s, kind, payload, dedup_key, chat_id)
+    if chat_id is not None:
+        await s.merge(JobWaiter(job_id=job_id, chat_id=chat_id))
+    await s.commit()
+    return job_id, joined
+
+async def claim_job(s: AsyncSession, kinds: Iterable[str], worker: str,
+                    stale_after: float, max_attempts: int) -> Job | None:
+    """Забирает старейшую задачу нужного вида; занятые другими воркерами строки пропускаются.
+
+    Задача в статусе running без heartbeat дольше stale_after считается
+    брошенной упавшим процессом и забирается повторно.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=stale_after)
+    q = (
+        select(Job)
+        .where(Job.kind.in_(list(kinds)),
+               or_(Job.status == QUEUED, and_(Job.status == RUNNING, Job.heartbeat_at < stale)))
+        .order_by(Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    while True:
+        job = (await s.execute(q)).scalar_one_or_none()
+        if job is None:
+            await s.commit()
+            return None
+        if job.attempts >= max_attempts:
+            job.status, job.result, job.finished_at = FAILED, "превышено число попыток", now
+            await s.commit()
+            log.error("Задача #%s (%s) снята после %s попыток", job.id, job.kind, job.attempts)
+            continue
+        job.status, job.worker = RUNNING, worker
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = now
+        await s.commit()
+        return job
+
+async def heartbeat(s: AsyncSession, job_id: int):
+    await s.execute(update(Job).where(Job.id == job_id, Job.status == RUNNING).values(heartbeat_at=datetime.utcnow()))
+    await s.commit()
+
+async def release_job(s: AsyncSession, job_id: int):
+    """Вернуть задачу в очередь (воркер останавливается штатно и не доделал её); попытка не засчитывается."""
+    await s.execute(update(Job).where(Job.id == job_id, Job.status == RUNNING)
+                    .values(status=QUEUED, attempts=Job.attempts - 1))
+    await s.commit()
+
+async def finish_job(s: AsyncSession, job_id: int, ok: bool, result: str | None = None):
+    await s.execute(update(Job).where(Job.id == job_id).values(
+        status=DONE if ok else FAILED, result=result, finished_at=datetime.utcnow()))
+    await s.commit()
+
+async def last_done_job_id(s: AsyncSession, kind: str) -> int | None:
+    res = await s.execute(select(func.max(Job.id)).where(Job.kind == kind, Job.status == DONE))
+    return res.scalar()
+
+async def recent_jobs(s: AsyncSession, limit: int = 10) -> list[Job]:
+    res = await s.execute(select(Job).order_by(Job.id.desc()).limit(limit))
+    return list(res.scalars().all())
+
+async def claim_notifications(s: AsyncSession, limit: int = 100) -> list[tuple[JobWaiter, Job]]:
+    """Ожидающие уведомления о завершённых задачах; строки остаются заблокированными до commit."""
+    res = await s.execute(
+        select(JobWaiter, Job)
+        .join(Job, Job.id == JobWaiter.job_id)
+        .where(Job.status.in_((DONE, FAILED)))
+        .limit(limit)
+        .with_for_update(of=JobWaiter, skip_locked=True)
+    )
+    return [tuple(r) for r in res.all()]
+
+async def forget_waiters(s: AsyncSession, pairs: Iterable[tuple[int, int]]):
+    for job_id, chat_id in pairs:
+        await s.execute(delete(JobWaiter).where(JobWaiter.job_id == job_id, JobWaiter.chat_id == chat_id))
+    await s.commit()
+
+class JobWorker:
+    """Цикл воркера: забрать задачу, выполнить обработчик её вида, записать итог.
+
+    Пока обработчик работает, раз в heartbeat_interval обновляется
+    heartbeat_at — по нему другие воркеры отличают живую задачу от брошенной.
+    """
+
+    def __init__(self, Session: async_sessionmaker[AsyncSession], handlers: Dict[str, JobHandler], name: str,
+                 poll_interval: float = 2.0, heartbeat_interval: float = 15.0,
+                 stale_after: float = 120.0, max_attempts: int = 3):
+        self.Session = Session
+        self.handlers = handlers
+        self.name = name
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+    async def run_once(self) -> bool:
+        async with self.Session() as s:
+            job = await claim_job(s, self.handlers, self.name, self.stale_after, self.max_attempts)
+        if job is None:
+            return False
+        log.info("%s: задача #%s (%s), попытка %s", self.name, job.id, job.kind, job.attempts)
+        beat = asyncio.create_task(self._beat(job.id))
+        try:
+            result = await self.handlers[job.kind](job)
+        except asyncio.CancelledError:
+            # штатная остановка — возвращаем задачу в очередь; при падении её подберут по устаревшему heartbeat
+            await asyncio.shield(self._release(job.id))
+            raise
+        except Exception as e:
+            log.exception("%s: задача #%s упала", self.name, job.id)
+            ok, result = False, f"{type(e).__name__}: {e}"
+        else:
+            ok = True
+        finally:
+            beat.cancel()
+            await asyncio.gather(beat, return_exceptions=True)
+        async with self.Session() as s:
+            await finish_job(s, job.id, ok, result)
+        return True
+
+    async def run_forever(self):
+        while True:
+            try:
+                busy = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("%s: ошибка очереди задач", self.name)
+                busy = False
+            if not busy:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _release(self, job_id: int):
+        async with self.Session() as s:
+            await release_job(s, job_id)
+
+    async def _beat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.Session() as s:
+                    await heartbeat(s, job_id)
+            except Exception:
+                log.warning("%s: не удалось обновить heartbeat задачи #%s", self.name, job_id)
+
+async def run_until_signal(*coros: Awaitable):
+    """Выполняет фоновые циклы воркера до SIGINT/SIGTERM.
+
+    Если один из циклов упал, остальные останавливаются, а исключение
+    пробрасывается — процесс завершится с ошибкой и супервизор его перезапустит.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    stopper = asyncio.create_task(stop.wait())
+    done, _ = await asyncio.wait([*tasks, stopper], return_when=asyncio.FIRST_COMPLETED)
+    for t in (*tasks, stopper):
+        t.cancel()
+    await asyncio.gather(*tasks, stopper, return_exceptions=True)
+    for t in done:
+        if t is not stopper and not t.cancelled() and t.exception() is not None:
+            raise t.exception()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import signal
+from functools import partial
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from .config import AppConfig
+from .db import ensure_indexes, init_engine
+from .models import Base, ChatLog
+from .repositories import admins_bootstrap
+from .scheduler import setup_scheduler, _scrape_and_digest, _autosend_job
+from .refresh import RefreshQueue, JobRefreshQueue
+from .jobs import SCRAPE, last_done_job_id
+from .telegram import make_bot
+from .chatlog import ChatLogWriter, ChatLogMiddleware, ChatLogRequestMiddleware
+from .catalog_cache import catalog_cache
+from .instrumentation import (
+    DbSessionMiddleware, HandlerNameMiddleware, install_query_hooks, metrics, start_metrics_server
+)
+from .webhook import WebhookServer
+from .fsm_storage import SqlStorage, make_fsm_storage
+from .search import search_service
+
+log = logging.getLogger(__name__)
+
+class BotRuntime:
+    """Всё, что нужно пользовательскому боту, кроме приёма апдейтов.
+
+    Одна и та же сборка (БД, middleware, роутеры, фоновые задачи)
+    используется и long polling'ом, и вебхуком. С supervised=True парсинг
+    и рассылки выполняют другие процессы: бот только ставит задачи в jobs
+    и сбрасывает кэш каталога, когда scrape-воркер его обновил.
+    """
+
+    def __init__(self, cfg: AppConfig, with_scheduler: bool = True, supervised: bool = False):
+        self.cfg = cfg
+        self.supervised = supervised
+        self.with_scheduler = with_scheduler and not supervised
+        self.engine: AsyncEngine | None = None
+        self.Session: async_sessionmaker[AsyncSession] | None = None
+        self.bot: Bot | None = None
+        self.dp: Dispatcher | None = None
+        self.chat_log: ChatLogWriter | None = None
+        self.storage: BaseStorage | None = None
+        self.refresh_queue: RefreshQueue | JobRefreshQueue | None = None
+        self.scheduler: AsyncIOScheduler | None = None
+        self._metrics_runner = None
+        self._catalog_watch: asyncio.Task | None = None
+
+    async def start(self):
+        from bot.handlers import router as bot_router
+        from control_bot.handlers import router as control_router
+        cfg = self.cfg
+
+        self.engine, self.Session = init_engine(cfg.database_url)
+        install_query_hooks(self.engine)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(ensure_indexes, ChatLog.__table__)
+
+        async with self.Session() as s:
+            await admins_bootstrap(s, cfg.admin_ids)
+
+        self.chat_log = ChatLogWriter(self.Session, batch_size=cfg.chat_log.batch_size,
+                                      flush_interval=cfg.chat_log.flush_interval,
+                                      max_queue=cfg.chat_log.max_queue, on_overflow=cfg.chat_log.on_overflow)
+        self.chat_log.start()
+
+        self.bot = make_bot(cfg)
+        self.bot.session.middleware(ChatLogRequestMiddleware(self.chat_log))
+        self.storage = make_fsm_storage(cfg.fsm, self.Session)
+        if isinstance(self.storage, SqlStorage):
+            await self.storage.start()
+            metrics.gauges["shopbot_fsm_cache_hits"] = lambda: self.storage.hits
+            metrics.gauges["shopbot_fsm_cache_misses"] = lambda: self.storage.misses
+        dp = self.dp = Dispatcher(storage=self.storage)
+        dp.include_router(control_router)
+        dp.include_router(bot_router)
+        dp["admin_ids"] = set(cfg.admin_ids)
+        dp.message.outer_middleware(ChatLogMiddleware(self.chat_log))
+        # сессия открывается только хендлерам, которые ходят в БД; запросы считаются по апдейтам
+        dp.update.outer_middleware(DbSessionMiddleware(self.Session, cfg.metrics.slow_update_ms, cfg.metrics.max_statements))
+        dp.message.middleware(HandlerNameMiddleware())
+        dp.callback_query.middleware(HandlerNameMiddleware())
+
+        metrics.gauges["shopbot_chatlog_dropped"] = lambda: self.chat_log.dropped
+        metrics.gauges["shopbot_catalog_cache_hits"] = lambda: catalog_cache.hits
+        metrics.gauges["shopbot_catalog_cache_misses"] = lambda: catalog_cache.misses
+        if cfg.metrics.port:
+            self._metrics_runner = await start_metrics_server(cfg.metrics.port)
+
+        if self.supervised:
+            self.refresh_queue = JobRefreshQueue(self.Session)
+            self._catalog_watch = asyncio.create_task(self._watch_catalog(cfg.supervisor.catalog_poll_interval))
+        else:
+            self.refresh_queue = RefreshQueue(lambda: _scrape_and_digest(cfg, self.bot), self.bot)
+        self.refresh_queue.start()
+        dp["refresh_queue"] = self.refresh_queue
+
+        search_service.refresh(self.Session)  # первый поиск не будет ждать построения индекса
+
+        if self.with_scheduler:
+            self.scheduler = setup_scheduler(cfg, self.refresh_queue.run, partial(_autosend_job, cfg, self.bot))
+            self.scheduler.start()
+
+    async def _watch_catalog(self, interval: float):
+        """Каталог обновляет другой процесс — узнаём об этом по новой завершённой задаче scrape."""
+        last = None
+        while True:
+            try:
+                async with self.Session() as s:
+                    current = await last_done_job_id(s, SCRAPE)
+                if last is not None and current != last:
+                    catalog_cache.invalidate()
+                last = current
+            except Exception:
+                log.warning("Не удалось проверить обновление каталога", exc_info=True)
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        if self._catalog_watch is not None:
+            self._catalog_watch.cancel()
+            await asyncio.gather(self._catalog_watch, return_exceptions=True)
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+        if self.refresh_queue is not None:
+            await self.refresh_queue.close()
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+        if self.storage is not None:
+            await self.storage.close()  # досохраняет несброшенные состояния FSM
+        if self.chat_log is not None:
+            await self.chat_log.close()
+            log.info("Журнал: записано %s, отброшено %s, ошибок записи %s",
+                     self.chat_log.written, self.chat_log.dropped, self.chat_log.failed)
+        if self.bot is not None:
+            await self.bot.session.close()
+        if self.engine is not None:
+            await self.engine.dispose()
+
+async def run_polling(rt: BotRuntime):
+    print("Bot started (polling). Ctrl+C to stop.")
+    await rt.dp.start_polling(rt.bot)
+
+async def run_webhook(rt: BotRuntime):
+    wh = rt.cfg.webhook
+    server = WebhookServer(rt.dp, rt.bot, path=wh.path, secret=wh.secret, workers=wh.workers,
+                           queue_size=wh.queue_size, dedup_size=wh.dedup_size, drain_timeout=wh.drain_timeout)
+    await rt.dp.emit_startup(bot=rt.bot)
+    await server.start(wh.host, wh.port)
+    if wh.url:
+        await rt.bot.set_webhook(wh.url, secret_token=wh.secret,
+                                 allowed_updates=rt.dp.resolve_used_update_types())
+    print(f"Bot started (webhook {wh.host}:{wh.port}{wh.path}). Ctrl+C to stop.")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await server.stop()
+        await rt.dp.emit_shutdown(bot=rt.bot)
+
+async def run_bot(cfg: AppConfig, webhook: bool = False, supervised: bool = False):
+    rt = BotRuntime(cfg, supervised=supervised)
+    await rt.start()
+    try:
+        await (run_webhook(rt) if webhook else run_polling(rt))
+    finally:
+        await rt.stop()
@@ -1,6 +1,7 @@
 from datetime import datetime
+from decimal import Decimal
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, Text, DateTime, Boolean
+from sqlalchemy import Integer, String, Text, DateTime, Boolean, ForeignKey, Index, Numeric, text
 from .db import Base
 
 class User(Base):
@@ -20,3 +21,82 @@ class ChatLog(Base):
     direction: Mapped[str] = mapped_column(String(8))  # in/out
     text: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_chat_logs_tg_created", "tg_id", "created_at"),  # переписка пользователя за период
+        Index("idx_chat_logs_created", "created_at"),              # последние сообщения, очистка по сроку
+    )
+
+class BroadcastCheckpoint(Base):
+    __tablename__ = "broadcast_checkpoints"
+    job_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)  # users.id, до которого всё отправлено
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    done: Mapped[bool] = mapped_column(Boolean, default=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    """Фоновая задача для воркеров супервизора; забирается через SELECT ... FOR UPDATE SKIP LOCKED."""
+    __tablename__ = "jobs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32), index=True)       # scrape/broadcast
+    dedup_key: Mapped[str | None] = mapped_column(String(64))       # не больше одной активной задачи с таким ключом
+    payload: Mapped[str | None] = mapped_column(Text)               # JSON
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True)  # queued/running/done/failed
+    result: Mapped[str | None] = mapped_column(Text)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    worker: Mapped[str | None] = mapped_column(String(64))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("uq_jobs_active_dedup", "dedup_key", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')"),
+              sqlite_where=text("status IN ('queued', 'running')")),
+    )
+
+class JobWaiter(Base):
+    """Чат, которому нужно сообщить о завершении задачи (строка удаляется после отправки)."""
+    __tablename__ = "job_waiters"
+    job_id: Mapped[int] = mapped_column(ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True)
+    chat_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+class FsmRecord(Base):
+    """Состояние FSM aiogram (NameState/CatState и т. п.) — общее для всех процессов бота."""
+    __tablename__ = "fsm_states"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # bot:chat:user:thread:business:destiny
+    state: Mapped[str | None] = mapped_column(String(128))
+    data: Mapped[str | None] = mapped_column(Text)                   # JSON
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class PriceHistory(Base):
+    """Цена товара с момента, когда она стала такой; строка пишется только при изменении цены."""
+    __tablename__ = "price_history"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ident: Mapped[str] = mapped_column(String(64))                        # product_ident товара
+    category: Mapped[str] = mapped_column(String(128))                    # таблица категории, где замечено
+    price_value: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    prev_value: Mapped[Decimal | None] = mapped_column(Numeric(12, 2))    # NULL — первая известная цена
+    currency: Mapped[str | None] = mapped_column(String(8))
+    observed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("idx_price_history_ident", "ident", "id"),  # последняя цена товара — MAX(id) по ident
+    )
+
+class Watch(Base):
+    """Что пользователь отслеживает: категорию (target — таблица) или товар (target — ident)."""
+    __tablename__ = "watches"
+    tg_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(16), primary_key=True)       # category/product
+    target: Mapped[str] = mapped_column(String(128), primary_key=True)
+    title: Mapped[str] = mapped_column(String(255))                       # для списка подписок и дайджеста
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_watches_target", "kind", "target"),  # соединение с price_history при сборке дайджестов
+    )
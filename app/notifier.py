@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+from functools import partial
+
+from aiogram import Bot
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .broadcast import Broadcaster
+from .config import AppConfig
+from .db import init_engine
+from .jobs import (
+    BROADCAST, DIGEST, DONE, SCRAPE, JobWorker, claim_notifications, forget_waiters, job_payload, run_until_signal
+)
+from .models import Base, Job
+from .price_watch import send_price_digests
+from .telegram import make_bot
+
+log = logging.getLogger(__name__)
+
+# тексты уведомлений запросившим: (успех, ошибка)
+_TEXTS = {
+    SCRAPE: ("Готово! Каталог обновлён.\n{result}", "Ошибка при обновлении. Проверьте config.yaml."),
+    BROADCAST: ("Рассылка завершена.\n{result}", "Рассылка не удалась: {result}"),
+}
+
+def _notification_text(job: Job) -> str:
+    ok, failed = _TEXTS.get(job.kind, ("Задача #{id} выполнена.\n{result}", "Задача #{id} не удалась: {result}"))
+    return (ok if job.status == DONE else failed).format(id=job.id, result=job.result or "")
+
+async def deliver_notifications(Session: async_sessionmaker[AsyncSession], bot: Bot) -> int:
+    """Отправляет сообщения о завершённых задачах; строка ожидания удаляется после попытки отправки."""
+    async with Session() as s:
+        pending = await claim_notifications(s)
+        if not pending:
+            await s.commit()
+            return 0
+        for waiter, job in pending:
+            try:
+                await bot.send_message(waiter.chat_id, _notification_text(job))
+            except Exception:
+                log.warning("Не удалось уведомить чат %s о задаче #%s", waiter.chat_id, job.id)
+        await forget_waiters(s, [(w.job_id, w.chat_id) for w, _ in pending])
+    return len(pending)
+
+async def _notify_loop(Session: async_sessionmaker[AsyncSession], bot: Bot, interval: float):
+    while True:
+        try:
+            sent = await deliver_notifications(Session, bot)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Ошибка доставки уведомлений")
+            sent = 0
+        if not sent:
+            await asyncio.sleep(interval)
+
+async def _broadcast_job(cfg: AppConfig, bot: Bot, Session: async_sessionmaker[AsyncSession], job: Job) -> str:
+    p = job_payload(job)
+    b = cfg.broadcast
+    broadcaster = Broadcaster(bot, Session, rate_per_sec=b.rate_per_sec, per_chat_interval=b.per_chat_interval,
+                              concurrency=b.concurrency, chunk_size=b.chunk_size)
+    # контрольная точка рассылки переживает перезапуск процесса: повтор задачи продолжит с места остановки
+    stats = await broadcaster.run(p["text"], job_id=p.get("checkpoint") or f"job-{job.id}",
+                                  only_subscribed=p.get("only_subscribed", True))
+    return str(stats)
+
+async def _digest_job(cfg: AppConfig, bot: Bot, Session: async_sessionmaker[AsyncSession], job: Job) -> str:
+    p = job_payload(job)
+    return str(await send_price_digests(cfg, bot, Session, p["after"], p["upto"]))
+
+async def run_notifier_worker(cfg: AppConfig):
+    """Процесс notifier супервизора: рассылки и сообщения о завершении фоновых задач."""
+    engine, Session = init_engine(cfg.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    bot = make_bot(cfg)
+    sup = cfg.supervisor
+    handlers = {BROADCAST: partial(_broadcast_job, cfg, bot, Session), DIGEST: partial(_digest_job, cfg, bot, Session)}
+    worker = JobWorker(Session, handlers, name=f"notifier-{os.getpid()}",
+                       poll_interval=sup.poll_interval, heartbeat_interval=sup.heartbeat_interval,
+                       stale_after=sup.stale_after, max_attempts=sup.max_attempts)
+    try:
+        await run_until_signal(worker.run_forever(), _notify_loop(Session, bot, sup.poll_interval))
+    finally:
+        await bot.session.close()
+        await engine.dispose()
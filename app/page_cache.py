@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Tuple
+
+@dataclass
+class CacheEntry:
+    url: str
+    sha256: str
+    size: int                     # байт тела страницы
+    atime: float
+    etag: str | None = None
+    last_modified: str | None = None
+    parsed_fp: str | None = None  # отпечаток парсера, которым получен сохранённый разбор
+    parsed_size: int = 0
+
+class PageCache:
+    """Дисковый кэш страниц каталога для условных запросов.
+
+    Для каждого URL хранится тело страницы, ETag/Last-Modified и результат
+    разбора. Общий объём ограничен max_bytes, при переполнении удаляются
+    давно не использованные страницы (LRU по atime). Индекс записывается
+    на диск в save(); методы безопасны для вызова из потоков разбора.
+    """
+
+    INDEX = "index.json"
+
+    def __init__(self, directory: str, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, CacheEntry] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _path(self, url: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{self._key(url)}.{ext}")
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self._entries = {u: CacheEntry(**e) for u, e in raw.items()}
+        except (OSError, ValueError, TypeError):
+            self._entries = {}
+        # файлы, не попавшие в индекс (прогон прервался до save), удаляем
+        known = {self._key(u) for u in self._entries}
+        for name in os.listdir(self.directory):
+            if name != self.INDEX and name.split(".", 1)[0] not in known:
+                self._remove_file(os.path.join(self.directory, name))
+
+    def save(self):
+        with self._lock:
+            data = {u: asdict(e) for u, e in self._entries.items()}
+        tmp = os.path.join(self.directory, self.INDEX + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.directory, self.INDEX))
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e.size + e.parsed_size for e in self._entries.values())
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        return self._entries.get(url)
+
+    def read_body(self, url: str) -> str | None:
+        try:
+            with open(self._path(url, "html"), "r", encoding="utf-8") as f:
+                body = f.read()
+        except OSError:
+            return None
+        self.touch(url)
+        return body
+
+    def touch(self, url: str):
+        with self._lock:
+            e = self._entries.get(url)
+            if e is not None:
+                e.atime = time.time()
+
+    def store(self, url: str, body: str, sha256: str, etag: str | None, last_modified: str | None):
+        data = body.encode("utf-8")
+        with open(self._path(url, "html"), "wb") as f:
+            f.write(data)
+        with self._lock:
+            old = self._entries.get(url)
+            entry = CacheEntry(url=url, sha256=sha256, size=len(data), atime=time.time(),
+                               etag=etag, last_modified=last_modified)
+            if old is not None and old.sha256 == sha256:
+                # содержимое не изменилось — сохранённый разбор остаётся годным
+                entry.parsed_fp, entry.parsed_size = old.parsed_fp, old.parsed_size
+            else:
+                self._remove_file(self._path(url, "json"))
+            self._entries[url] = entry
+            self._evict()
+
+    def read_parsed(self, url: str, fingerprint: str) -> Tuple[List[Dict], List[str]] | None:
+        e = self._entries.get(url)
+        if e is None or e.parsed_fp != fingerprint:
+            return None
+        try:
+            with open(self._path(url, "json"), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.touch(url)
+        return raw["items"], raw["links"]
+
+    def store_parsed(self, url: str, fingerprint: str, items: List[Dict], links: List[str]):
+        if url not in self._entries:
+            return
+        data = json.dumps({"items": items, "links": links}, ensure_ascii=False).encode("utf-8")
+        with open(self._path(url, "json"), "wb") as f:
+            f.write(data)
+        with self._lock:
+            e = self._entries.get(url)
+            if e is None:
+                return
+            e.parsed_fp, e.parsed_size = fingerprint, len(data)
+            self._evict()
+
+    def _evict(self):
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for url, e in sorted(self._entries.items(), key=lambda kv: kv[1].atime):
+            if total <= self.max_bytes:
+                break
+            total -= e.size + e.parsed_size
+            del self._entries[url]
+            self._remove_file(self._path(url, "html"))
+            self._remove_file(self._path(url, "json"))
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
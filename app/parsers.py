@@ -0,0 +1,199 @@
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, List, Tuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+try:  # lxml + cssselect — быстрый бэкенд, без них работает BeautifulSoup
+    import lxml.html
+    from lxml import etree
+    from cssselect import GenericTranslator
+except ImportError:  # pragma: no cover
+    lxml = None
+
+PageResult = Tuple[List[Dict], List[str]]
+
+_PAGER_RX = re.compile(r"[0-9]{1,3}")
+
+def _clean_text(s: str) -> str:
+    return re.sub(r"\s+", " ", (s or "").strip())
+
+def _abs(base: str, href: str | None) -> str | None:
+    if not href:
+        return None
+    return urljoin(base, href)
+
+def _is_pager_text(txt: str) -> bool:
+    txt = (txt or "").strip().lower()
+    return bool(_PAGER_RX.fullmatch(txt)) or "след" in txt or "next" in txt
+
+class SelectorPlan:
+    """Списки селекторов с запоминанием, какой селектор карточки сработал на хосте.
+
+    На следующих страницах того же хоста первым пробуется запомненный
+    селектор карточки, остальные — в исходном порядке как запасные.
+    Поля карточки всегда ищутся в заданном порядке: списки заканчиваются
+    общими селекторами вроде «a», и запомненный запасной вариант перехватил
+    бы у следующих карточек их настоящее название.
+    """
+
+    ADAPTIVE = ("card",)
+
+    def __init__(self, selectors: dict):
+        self.lists = {
+            "card": list(selectors["card"]),
+            "title": list(selectors["title"]),
+            "price": list(selectors["price"]),
+        }
+        self.link_from_title = selectors.get("link_from_title", True)
+        self._preferred: Dict[tuple[str, str], int] = {}
+
+    def order(self, host: str, kind: str) -> List[int]:
+        n = len(self.lists[kind])
+        best = self._preferred.get((host, kind)) if kind in self.ADAPTIVE else None
+        if best is None:
+            return list(range(n))
+        return [best] + [i for i in range(n) if i != best]
+
+    def remember(self, host: str, kind: str, idx: int):
+        if kind in self.ADAPTIVE:
+            self._preferred[(host, kind)] = idx
+
+class HtmlParser:
+    name = "base"
+
+    def __init__(self, selectors: dict):
+        self.selectors = selectors
+        self.plan = SelectorPlan(selectors)
+        # по отпечатку кэш страниц понимает, годится ли сохранённый разбор
+        raw = json.dumps([self.name, self.plan.lists, self.plan.link_from_title], ensure_ascii=False)
+        self.fingerprint = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def parse(self, html: str, page: str) -> PageResult:
+        raise NotImplementedError
+
+    def _first(self, host: str, kind: str, find):
+        for i in self.plan.order(host, kind):
+            found = find(i)
+            # пустой список — селектор не сработал; элементы lxml без детей ложны, поэтому is None
+            if found is None or (isinstance(found, list) and not found):
+                continue
+            self.plan.remember(host, kind, i)
+            return found
+        return None
+
+    def _same_host_links(self, page: str, hrefs) -> List[str]:
+        host = urlparse(page).netloc
+        links = []
+        for href in hrefs:
+            nxt = _abs(page, href)
+            if nxt and urlparse(nxt).netloc == host:
+                links.append(nxt)
+        return links
+
+class Bs4Parser(HtmlParser):
+    name = "html.parser"
+
+    def parse(self, html: str, page: str) -> PageResult:
+        soup = BeautifulSoup(html, "html.parser")
+        host = urlparse(page).netloc
+        lists = self.plan.lists
+
+        cards = self._first(host, "card", lambda i: soup.select(lists["card"][i])) or []
+        items: List[Dict] = []
+        for c in cards:
+            title_el = self._first(host, "title", lambda i: c.select_one(lists["title"][i]))
+            price_el = self._first(host, "price", lambda i: c.select_one(lists["price"][i]))
+            if not title_el or not price_el:
+                continue
+            items.append({
+                "title": _clean_text(title_el.get_text()),
+                "price": _clean_text(price_el.get_text()),
+                "url": _abs(page, title_el.get("href")) if self.plan.link_from_title else None
+            })
+
+        # простая пагинация
+        hrefs = (a.get("href") for a in soup.find_all("a") if _is_pager_text(a.get_text()))
+        return items, self._same_host_links(page, hrefs)
+
+class LxmlParser(HtmlParser):
+    """lxml-бэкенд: селекторы один раз транслируются в XPath и компилируются.
+
+    Скомпилированные XPath не разделяются между потоками, поэтому
+    у каждого потока разбора свой набор.
+    """
+    name = "lxml"
+
+    def __init__(self, selectors: dict):
+        if lxml is None:
+            raise RuntimeError("Для парсера lxml установите пакеты lxml и cssselect")
+        super().__init__(selectors)
+        tr = GenericTranslator()
+        # карточки ищем от корня документа, поля — только среди потомков карточки (как select_one в bs4)
+        self._xpaths = {
+            "card": [tr.css_to_xpath(s) for s in self.plan.lists["card"]],
+            "title": [tr.css_to_xpath(s, prefix="descendant::") for s in self.plan.lists["title"]],
+            "price": [tr.css_to_xpath(s, prefix="descendant::") for s in self.plan.lists["price"]],
+        }
+        self._local = threading.local()
+
+    def _compiled(self) -> Dict[str, list]:
+        c = getattr(self._local, "compiled", None)
+        if c is None:
+            c = {k: [etree.XPath(x) for x in xs] for k, xs in self._xpaths.items()}
+            # грубый отбор ссылок пагинации делает libxml2, точную проверку — _is_pager_text
+            c["pager"] = etree.XPath(
+                "//a[@href][string-length(normalize-space(.)) <= 3"
+                " or contains(translate(., 'СЛЕДNEXT', 'следnext'), 'след')"
+                " or contains(translate(., 'СЛЕДNEXT', 'следnext'), 'next')]"
+            )
+            self._local.compiled = c
+        return c
+
+    def parse(self, html: str, page: str) -> PageResult:
+        doc = lxml.html.document_fromstring(html) if html.strip() else None
+        if doc is None:
+            return [], []
+        host = urlparse(page).netloc
+        xp = self._compiled()
+
+        cards = self._first(host, "card", lambda i: xp["card"][i](doc)) or []
+        items: List[Dict] = []
+        for c in cards:
+            title_el = self._first(host, "title", lambda i: next(iter(xp["title"][i](c)), None))
+            price_el = self._first(host, "price", lambda i: next(iter(xp["price"][i](c)), None))
+            if title_el is None or price_el is None:
+                continue
+            items.append({
+                "title": _clean_text(title_el.text_content()),
+                "price": _clean_text(price_el.text_content()),
+                "url": _abs(page, title_el.get("href")) if self.plan.link_from_title else None
+            })
+
+        hrefs = (a.get("href") for a in xp["pager"](doc) if _is_pager_text(a.text_content()))
+        return items, self._same_host_links(page, hrefs)
+
+BACKENDS = {Bs4Parser.name: Bs4Parser, LxmlParser.name: LxmlParser}
+
+def make_parser(selectors: dict, backend: str = "auto") -> HtmlParser:
+    if backend == "auto":
+        backend = LxmlParser.name if lxml is not None else Bs4Parser.name
+    try:
+        cls = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Неизвестный HTML-парсер: {backend}")
+    return cls(selectors)
+
+_process_parsers: Dict[str, HtmlParser] = {}
+
+def parse_in_process(selectors: dict, backend: str, html: str, page: str) -> PageResult:
+    """Точка входа для ProcessPoolExecutor: парсер создаётся один раз на процесс
+    и, как в потоковом режиме, запоминает сработавшие селекторы."""
+    key = json.dumps([backend, selectors], ensure_ascii=False, sort_keys=True)
+    parser = _process_parsers.get(key)
+    if parser is None:
+        parser = _process_parsers[key] = make_parser(selectors, backend)
+    return parser.parse(html, page)
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import AppConfig
+from .categorizer import Categorizer
+from .dynamic_products import SyncStats, make_catalog_writer
+from .page_cache import PageCache
+from .frontier import CrawlStats
+from .scraper import scrape_products_multi
+
+_DONE = None  # маркер конца потока в очередях
+
+@dataclass
+class StageTimings:
+    """Время стадий конвейера: для категоризации и записи — только собственная работа, без ожидания очередей."""
+    pages: int = 0
+    items: int = 0
+    scrape_s: float = 0.0      # от старта до последней разобранной страницы
+    categorize_s: float = 0.0
+    write_s: float = 0.0       # запись порций
+    finish_s: float = 0.0      # writer.finish(): удаление исчезнувших товаров / переключение версии
+    total_s: float = 0.0
+    crawl: CrawlStats = field(default_factory=CrawlStats)  # повторные страницы и отброшенные дубли товаров
+
+    def as_dict(self) -> dict:
+        return {k: round(v, 4) if isinstance(v, float) else v for k, v in asdict(self).items()}
+
+    def __str__(self) -> str:
+        return (f"страниц={self.pages} товаров={self.items} парсинг={self.scrape_s:.1f}s "
+                f"категоризация={self.categorize_s:.2f}s запись={self.write_s:.2f}s "
+                f"финал={self.finish_s:.2f}s всего={self.total_s:.1f}s; "
+                f"дублей: ссылок={self.crawl.duplicate_pages} товаров={self.crawl.duplicate_items}")
+
+def selectors_from_config(cfg: AppConfig) -> dict:
+    return {
+        "card": cfg.scrape.selectors.card,
+        "title": cfg.scrape.selectors.title,
+        "price": cfg.scrape.selectors.price,
+        "link_from_title": cfg.scrape.selectors.link_from_title
+    }
+
+async def _scrape_stage(cfg: AppConfig, pages_q: asyncio.Queue, timings: StageTimings):
+    cache = PageCache(cfg.scrape.cache_dir, cfg.scrape.cache_max_mb * 1024 * 1024) if cfg.scrape.cache_dir else None
+    t0 = time.perf_counter()
+
+    async def on_page(items: List[dict]):
+        timings.pages += 1
+        timings.items += len(items)
+        await pages_q.put(items)
+
+    try:
+        await scrape_products_multi(
+            cfg.scrape.urls, selectors_from_config(cfg),
+            concurrency=cfg.scrape.concurrency, per_host=cfg.scrape.per_host,
+            timeout=cfg.scrape.timeout, parser=cfg.scrape.parser, cache=cache,
+            on_page=on_page, parse_processes=cfg.scrape.parse_processes, stats=timings.crawl,
+        )
+    finally:
+        timings.scrape_s = time.perf_counter() - t0
+        await pages_q.put(_DONE)
+
+async def _categorize_stage(cfg: AppConfig, pages_q: asyncio.Queue, write_q: asyncio.Queue, timings: StageTimings):
+    categorizer = Categorizer(cfg.categories)
+    batch_size = cfg.scrape.batch_size
+    buffers: Dict[str, List[dict]] = {}
+    try:
+        while (page_items := await pages_q.get()) is not _DONE:
+            t0 = time.perf_counter()
+            names = categorizer.categorize_many(it["title"] for it in page_items)
+            timings.categorize_s += time.perf_counter() - t0
+            for it, cat_name in zip(page_items, names):
+                cat_name = cat_name or "Прочее"
+                buf = buffers.setdefault(cat_name, [])
+                buf.append(it)
+                if len(buf) >= batch_size:
+                    await write_q.put((cat_name, buf))
+                    buffers[cat_name] = []
+        for cat_name, buf in buffers.items():
+            if buf:
+                await write_q.put((cat_name, buf))
+    finally:
+        await write_q.put(_DONE)
+
+async def _write_stage(session: AsyncSession, mode: str, write_q: asyncio.Queue, timings: StageTimings) -> SyncStats:
+    writer = make_catalog_writer(session, mode)
+    try:
+        await writer.begin()
+        while (batch := await write_q.get()) is not _DONE:
+            t0 = time.perf_counter()
+            await writer.write(*batch)
+            timings.write_s += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        stats = await writer.finish()
+        timings.finish_s = time.perf_counter() - t0
+        return stats
+    except Exception:
+        await writer.abort()
+        raise
+
+async def run_catalog_pipeline(cfg: AppConfig, session: AsyncSession, timings: StageTimings | None = None) -> SyncStats:
+    """Потоковый конвейер парсинг → категоризация → запись.
+
+    Стадии связаны ограниченными очередями: страницы разбираются по мере
+    загрузки, товары категоризируются постранично и уходят в БД порциями
+    по scrape.batch_size, пока остальные страницы ещё качаются. В памяти
+    одновременно не больше queue_size страниц и порций плюс недобранные
+    порции по категориям — объём не зависит от размера каталога.
+    """
+    timings = timings if timings is not None else StageTimings()
+    t0 = time.perf_counter()
+    pages_q: asyncio.Queue = asyncio.Queue(maxsize=cfg.scrape.queue_size)
+    write_q: asyncio.Queue = asyncio.Queue(maxsize=cfg.scrape.queue_size)
+    tasks = [
+        asyncio.create_task(_scrape_stage(cfg, pages_q, timings)),
+        asyncio.create_task(_categorize_stage(cfg, pages_q, write_q, timings)),
+    ]
+    writer = asyncio.create_task(_write_stage(session, cfg.scrape.write_mode, write_q, timings))
+    try:
+        await asyncio.gather(*tasks, writer)
+    except BaseException:
+        for t in (*tasks, writer):
+            t.cancel()
+        await asyncio.gather(*tasks, writer, return_exceptions=True)
+        raise
+    finally:
+        timings.total_s = time.perf_counter() - t0
+    return writer.result()
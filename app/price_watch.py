@@ -0,0 +1,121 @@
+import html
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from aiogram import Bot
+from sqlalchemy import and_, case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .broadcast import Broadcaster, BroadcastStats
+from .config import AppConfig
+from .dynamic_products import pretty_cat_from_table
+from .models import PriceHistory, User, Watch
+from .prices import format_price
+from .telegram import split_message
+
+CATEGORY, PRODUCT = "category", "product"
+MAX_WATCHES = 50        # подписок на одного пользователя
+_DIGEST_PRODUCTS = 10   # строк по отдельным товарам в одном сообщении
+
+# --- подписки ---
+
+async def add_watch(s: AsyncSession, tg_id: int, kind: str, target: str, title: str) -> str:
+    """added / exists / limit."""
+    if await s.get(Watch, (tg_id, kind, target)) is not None:
+        return "exists"
+    count = (await s.execute(select(func.count()).select_from(Watch).where(Watch.tg_id == tg_id))).scalar_one()
+    if count >= MAX_WATCHES:
+        return "limit"
+    s.add(Watch(tg_id=tg_id, kind=kind, target=target, title=title[:255]))
+    await s.commit()
+    return "added"
+
+async def remove_watch(s: AsyncSession, tg_id: int, kind: str, target: str) -> bool:
+    res = await s.execute(delete(Watch).where(Watch.tg_id == tg_id, Watch.kind == kind, Watch.target == target))
+    await s.commit()
+    return bool(res.rowcount)
+
+async def list_watches(s: AsyncSession, tg_id: int) -> List[Watch]:
+    res = await s.execute(select(Watch).where(Watch.tg_id == tg_id).order_by(Watch.kind, Watch.created_at))
+    return list(res.scalars().all())
+
+async def last_history_id(s: AsyncSession) -> int:
+    return (await s.execute(select(func.coalesce(func.max(PriceHistory.id), 0)))).scalar_one()
+
+# --- дайджесты ---
+
+@dataclass
+class Digest:
+    user_id: int
+    tg_id: int
+    categories: Dict[str, tuple[int, int]] = field(default_factory=dict)   # таблица -> (подешевело, подорожало)
+    products: Dict[str, tuple] = field(default_factory=dict)               # ident -> (название, было, стало, валюта)
+
+    def render(self) -> list[str]:
+        """HTML-сообщения дайджеста; длинный делится по строкам, а не посреди разметки."""
+        lines = ["📉 Изменились цены по вашим подпискам:\n"]
+        for t, (drops, rises) in sorted(self.categories.items()):
+            parts = ([f"подешевело {drops}"] if drops else []) + ([f"подорожало {rises}"] if rises else [])
+            lines.append(f"• <b>{html.escape(pretty_cat_from_table(t))}</b>: {', '.join(parts)}")
+        for title, old, new, currency in list(self.products.values())[:_DIGEST_PRODUCTS]:
+            mark = "🔻" if new < old else "🔺"
+            lines.append(f"{mark} {html.escape(title)}: {format_price(old)} → {format_price(new, currency)}")
+        if len(self.products) > _DIGEST_PRODUCTS:
+            lines.append(f"… и ещё {len(self.products) - _DIGEST_PRODUCTS} товаров")
+        return split_message(lines, "\n")
+
+async def build_digests(s: AsyncSession, after_id: int, upto_id: int) -> List[Digest]:
+    """Дайджесты по изменениям цен с id в (after_id, upto_id] для подписанных пользователей.
+
+    Два запроса на всех получателей сразу: по подпискам на категории —
+    соединение watches с price_history и группировка по (пользователь,
+    категория); по подпискам на товары — сами изменения.
+    """
+    h = PriceHistory
+    changed = and_(h.id > after_id, h.id <= upto_id, h.prev_value.is_not(None))
+    digests: Dict[int, Digest] = {}
+
+    counts = await s.execute(
+        select(User.id, User.tg_id, h.category,
+               # товар, подешевевший дважды за период, считается один раз
+               func.count(func.distinct(case((h.price_value < h.prev_value, h.ident)))),
+               func.count(func.distinct(case((h.price_value > h.prev_value, h.ident)))))
+        .select_from(Watch)
+        .join(h, and_(Watch.kind == CATEGORY, Watch.target == h.category))
+        .join(User, User.tg_id == Watch.tg_id)
+        .where(changed, User.subscribed == True)
+        .group_by(User.id, User.tg_id, h.category)
+    )
+    for user_id, tg_id, category, drops, rises in counts.all():
+        if drops or rises:
+            digests.setdefault(tg_id, Digest(user_id, tg_id)).categories[category] = (int(drops), int(rises))
+
+    items = await s.execute(
+        select(User.id, Watch.tg_id, Watch.target, Watch.title, h.prev_value, h.price_value, h.currency)
+        .select_from(Watch)
+        .join(h, and_(Watch.kind == PRODUCT, Watch.target == h.ident))
+        .join(User, User.tg_id == Watch.tg_id)
+        .where(changed, User.subscribed == True)
+        .order_by(h.id)
+    )
+    # за период цена могла смениться не раз: «было» — первое, «стало» — последнее
+    first_prev: Dict[tuple, object] = {}
+    for user_id, tg_id, ident, title, prev, value, currency in items.all():
+        old = first_prev.setdefault((tg_id, ident), prev)
+        d = digests.setdefault(tg_id, Digest(user_id, tg_id))
+        if old == value:
+            d.products.pop(ident, None)  # вернулась к прежней
+        else:
+            d.products[ident] = (title, old, value, currency)
+    return [d for d in digests.values() if d.categories or d.products]
+
+async def send_price_digests(cfg: AppConfig, bot: Bot, Session: async_sessionmaker[AsyncSession],
+                             after_id: int, upto_id: int) -> BroadcastStats:
+    """Отправляет дайджесты с лимитами рассылки; повтор с тем же диапазоном продолжит с контрольной точки."""
+    async with Session() as s:
+        digests = await build_digests(s, after_id, upto_id)
+    b = cfg.broadcast
+    broadcaster = Broadcaster(bot, Session, rate_per_sec=b.rate_per_sec, per_chat_interval=b.per_chat_interval,
+                              concurrency=b.concurrency, chunk_size=b.chunk_size)
+    return await broadcaster.run_personal([(d.user_id, d.tg_id, d.render()) for d in digests],
+                                          job_id=f"digest-{after_id}-{upto_id}")
@@ -0,0 +1,74 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+# «1 299,00 р.», «1299.5 BYN», «от 99 руб.», «$ 1,299.00» — пробелы-разделители тысяч бывают неразрывными
+# «1,299» — тысячи через запятую; простое число не должно обрываться перед «,299» или «.5»
+_NUM_RX = re.compile(
+    r"\d{1,3}(?:[ \u00a0\u202f]\d{3})+(?:[.,]\d{1,2})?(?!\d)"
+    r"|\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?(?![.,]?\d)"
+    r"|(?<!\d[.,])(?<!\d)\d+(?:[.,]\d{1,2})?(?![.,]?\d)"
+)
+_COMMA_THOUSANDS_RX = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+_CURRENCY_RX = [
+    (re.compile(r"₽|rub|рос\.?\s*руб", re.I), "RUB"),
+    (re.compile(r"byn|бел\.?\s*руб|\bр\b\.?|\bруб", re.I), "BYN"),
+    (re.compile(r"\$|usd", re.I), "USD"),
+    (re.compile(r"€|eur", re.I), "EUR"),
+]
+_CENTS = Decimal("0.01")
+_MAX_VALUE = Decimal(10) ** 10  # столбец price_value — NUMERIC(12, 2)
+
+def _to_decimal(num: str) -> Decimal | None:
+    s = num.replace("\u00a0", " ").replace("\u202f", " ")
+    if _COMMA_THOUSANDS_RX.fullmatch(s):   # 1,299 и 1,299.00 — запятая разделяет тысячи
+        s = s.replace(",", "")
+    s = s.replace(" ", "").replace(",", ".")
+    try:
+        return Decimal(s).quantize(_CENTS)
+    except InvalidOperation:
+        return None
+
+def parse_price(raw: str | None, default_currency: str | None = "BYN") -> tuple[Decimal | None, str | None]:
+    """Цена строкой с сайта → (число, валюта). Не разобрали — (None, None).
+
+    Если в блоке цены несколько сумм (старая и со скидкой), берётся меньшая;
+    проценты скидки не считаются суммами. Сумма, не помещающаяся в
+    price_value, — (None, валюта): товар попадёт в счётчик неразобранных.
+
+    >>> parse_price("1 299,00 р.")
+    (Decimal('1299.00'), 'BYN')
+    >>> parse_price("1,299 р.")
+    (Decimal('1299.00'), 'BYN')
+    >>> parse_price("$ 1,299.50")
+    (Decimal('1299.50'), 'USD')
+    >>> parse_price("12,5 руб.")
+    (Decimal('12.50'), 'BYN')
+    >>> parse_price("от 99 ₽")
+    (Decimal('99.00'), 'RUB')
+    >>> parse_price("Скидка 10% 1 299 р.")
+    (Decimal('1299.00'), 'BYN')
+    >>> parse_price("99 999 999 999 р.")
+    (None, 'BYN')
+    >>> parse_price("цена по запросу")
+    (None, None)
+    """
+    if not raw:
+        return None, None
+    found = (_to_decimal(m.group()) for m in _NUM_RX.finditer(raw) if not raw[m.end():].lstrip().startswith("%"))
+    values = [v for v in found if v is not None and v > 0]
+    if not values:
+        return None, None
+    currency = next((code for rx, code in _CURRENCY_RX if rx.search(raw)), default_currency)
+    values = [v for v in values if v < _MAX_VALUE]
+    return (min(values) if values else None), currency
+
+def format_price(value: Decimal | float | None, currency: str | None = None) -> str:
+    if value is None:
+        return "—"
+    s = f"{Decimal(str(value)).quantize(_CENTS):,.2f}".replace(",", " ").replace(".", ",")
+    return f"{s} {currency}" if currency else s
+
+def parse_amount(text: str) -> Decimal | None:
+    """Сумма, введённая пользователем: «500», «1 299,50», «1299.5р»."""
+    value, _ = parse_price(text, None)
+    return value
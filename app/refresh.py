@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .dynamic_products import SyncStats
+from .jobs import SCRAPE, enqueue_job
+
+log = logging.getLogger(__name__)
+
+class RefreshQueue:
+    """Очередь обновлений каталога с семантикой single-flight.
+
+    Парсинг выполняется фоновым воркером, а не в корутине хендлера. Пока
+    обновление идёт, новые запросы присоединяются к нему: все запросившие
+    чаты получат одно сообщение о завершении, а не запустят свои прогоны.
+    """
+
+    def __init__(self, job: Callable[[], Awaitable[SyncStats]], bot: Bot | None = None):
+        self.job = job
+        self.bot = bot
+        self._queue: asyncio.Queue[asyncio.Future] = asyncio.Queue()
+        self._current: asyncio.Future | None = None
+        self._waiters: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def busy(self) -> bool:
+        return self._current is not None and not self._current.done()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, chat_id: int | None = None) -> tuple[asyncio.Future, bool]:
+        """Ставит обновление в очередь или присоединяет к идущему; второй элемент — «присоединился»."""
+        joined = self.busy
+        if not joined:
+            self._current = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait(self._current)
+        if chat_id is not None:
+            self._waiters.add(chat_id)
+        return self._current, joined
+
+    async def request(self, chat_id: int | None = None) -> bool:
+        """Запрос из хендлера: True, если присоединились к уже идущему обновлению."""
+        return self.submit(chat_id)[1]
+
+    async def run(self, chat_id: int | None = None) -> SyncStats:
+        """Запросить обновление и дождаться его (для планировщика)."""
+        fut, _ = self.submit(chat_id)
+        return await asyncio.shield(fut)
+
+    async def _run(self):
+        while True:
+            fut = await self._queue.get()
+            try:
+                stats = await self.job()
+            except asyncio.CancelledError:
+                fut.cancel()
+                raise
+            except Exception as e:
+                log.exception("Обновление каталога не удалось")
+                fut.set_exception(e)
+                fut.exception()  # помечаем как полученное: ждать результата могут и не все
+                text = "Ошибка при обновлении. Проверьте config.yaml."
+            else:
+                fut.set_result(stats)
+                text = f"Готово! Каталог обновлён.\n{stats}"
+            waiters, self._waiters = self._waiters, set()
+            await self._notify(waiters, text)
+
+    async def _notify(self, chat_ids: set[int], text: str):
+        if self.bot is None:
+            return
+        for chat_id in chat_ids:
+            try:
+                await self.bot.send_message(chat_id, text)
+            except Exception:
+                log.warning("Не удалось уведомить чат %s об обновлении", chat_id)
+
+class JobRefreshQueue:
+    """Та же single-flight-семантика для работы под супервизором.
+
+    Обновление ставится задачей в таблицу jobs: выполняет его scrape-воркер
+    в своём процессе, о завершении запросивших извещает notifier.
+    """
+
+    def __init__(self, Session: async_sessionmaker[AsyncSession]):
+        self.Session = Session
+
+    def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def request(self, chat_id: int | None = None) -> bool:
+        async with self.Session() as s:
+            _, joined = await enqueue_job(s, SCRAPE, dedup_key=SCRAPE, chat_id=chat_id)
+        return joined
@@ -1,24 +1,102 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Iterable, List
 from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from .models import User, ChatLog
-
-async def get_or_create_user(s: AsyncSession, tg_id: int, username: str | None) -> User:
-    res = await s.execute(select(User).where(User.tg_id == tg_id))
-    u = res.scalar_one_or_none()
-    if u: return u
-    u = User(tg_id=tg_id, username=username)
-    s.add(u)
-    await s.commit()
-    return u
+from .models import User
+
+@dataclass
+class UserProfile:
+    """То, что хендлерам нужно о пользователе на каждом апдейте."""
+    tg_id: int
+    username: str | None
+    display_name: str | None
+    subscribed: bool
+    is_admin: bool
+
+    @classmethod
+    def from_row(cls, u) -> "UserProfile":
+        return cls(tg_id=u.tg_id, username=u.username, display_name=u.display_name,
+                   subscribed=bool(u.subscribed), is_admin=bool(u.is_admin))
+
+class UserCache:
+    """LRU-кэш профилей по tg_id с TTL (страховка от изменений из других процессов)."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[int, tuple[float, UserProfile]] = OrderedDict()
+
+    def get(self, tg_id: int) -> UserProfile | None:
+        entry = self._data.get(tg_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._data[tg_id]
+            return None
+        self._data.move_to_end(tg_id)
+        return entry[1]
+
+    def put(self, p: UserProfile):
+        self._data[p.tg_id] = (time.monotonic(), p)
+        self._data.move_to_end(p.tg_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def patch(self, tg_id: int, **fields):
+        p = self.get(tg_id)
+        if p is not None:
+            for k, v in fields.items():
+                setattr(p, k, v)
+
+    def forget(self, tg_ids: Iterable[int]):
+        for t in tg_ids:
+            self._data.pop(t, None)
+
+    def clear(self):
+        self._data.clear()
+
+user_cache = UserCache()
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+async def get_or_create_user(s: AsyncSession, tg_id: int, username: str | None) -> UserProfile:
+    cached = user_cache.get(tg_id)
+    if cached is not None:
+        return cached
+
+    insert = _UPSERT_DIALECTS.get(s.bind.dialect.name)
+    if insert is not None:
+        # INSERT … ON CONFLICT: один запрос и без гонки одновременных /start
+        stmt = insert(User).values(tg_id=tg_id, username=username, created_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(index_elements=[User.tg_id], set_={"tg_id": stmt.excluded.tg_id})
+        stmt = stmt.returning(User.tg_id, User.username, User.display_name, User.subscribed, User.is_admin)
+        row = (await s.execute(stmt)).one()
+        await s.commit()
+        p = UserProfile.from_row(row)
+    else:
+        res = await s.execute(select(User).where(User.tg_id == tg_id))
+        u = res.scalar_one_or_none()
+        if u is None:
+            u = User(tg_id=tg_id, username=username)
+            s.add(u)
+            await s.commit()
+        p = UserProfile.from_row(u)
+    user_cache.put(p)
+    return p
 
 async def set_user_name(s: AsyncSession, tg_id: int, name: str):
     await s.execute(update(User).where(User.tg_id == tg_id).values(display_name=name))
     await s.commit()
+    user_cache.patch(tg_id, display_name=name)
 
 async def set_subscribed(s: AsyncSession, tg_id: int, value: bool):
     await s.execute(update(User).where(User.tg_id == tg_id).values(subscribed=value))
     await s.commit()
+    user_cache.patch(tg_id, subscribed=value)
 
 async def list_users(s: AsyncSession, limit: int = 100) -> List[User]:
     res = await s.execute(select(User).order_by(User.created_at.desc()).limit(limit))
@@ -33,7 +111,4 @@ async def admins_bootstrap(s: AsyncSession, admin_ids: Iterable[int]):
     await s.commit()
     await s.execute(update(User).where(User.tg_id.in_(list(admin_ids))).values(is_admin=True))
     await s.commit()
-
-async def log_message(s: AsyncSession, tg_id: int, direction: str, text: str):
-    s.add(ChatLog(tg_id=tg_id, direction=direction, text=(text or "")[:4096]))
-    await s.commit()
+    user_cache.forget(admin_ids)
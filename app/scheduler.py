@@ -1,28 +1,44 @@
+import logging
+import os
+from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from zoneinfo import ZoneInfo
 from aiogram import Bot
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from .scraper import scrape_products_multi
-from .categorizer import pick_category_name
-from .dynamic_products import replace_all_categories_and_products
-from .db import get_sessionmaker
+from .dynamic_products import SyncStats
+from .pipeline import StageTimings, run_catalog_pipeline
+from .catalog_cache import catalog_cache
+from .broadcast import Broadcaster
+from .db import ensure_indexes, get_sessionmaker, init_engine
 from .config import AppConfig
+from .models import Base, ChatLog, Job
+from .jobs import SCRAPE, BROADCAST, DIGEST, JobWorker, enqueue_job, run_until_signal
+from .price_watch import last_history_id, send_price_digests
+from .chatlog import prune_chat_logs
+
+log = logging.getLogger(__name__)
+
+AUTOSEND_TEXT = "🔔 Каталог обновлён! Зайдите в бота и посмотрите категории."
 
 def _parse_hhmm(s: str) -> tuple[int,int]:
     hh, mm = s.strip().split(":")
     return int(hh), int(mm)
 
-def setup_scheduler(cfg: AppConfig, bot: Bot) -> AsyncIOScheduler:
+def setup_scheduler(cfg: AppConfig, scrape: Callable[[], Awaitable], autosend: Callable[[], Awaitable]) -> AsyncIOScheduler:
+    """scrape и autosend — корутинные функции без аргументов (или partial от них):
+    в одном процессе они выполняют работу, под супервизором — ставят задачи в jobs."""
     tz = ZoneInfo(cfg.tz)
     scheduler = AsyncIOScheduler(timezone=tz)
 
+    # ночной парсинг идёт через ту же очередь, что и ручное обновление
     hh, mm = _parse_hhmm(cfg.scrape.daily_time)
     scheduler.add_job(
-        func=_daily_scrape_full_replace,
+        func=scrape,
         trigger="cron",
         hour=hh, minute=mm,
-        args=[cfg],
         id="daily_scrape_replace",
         replace_existing=True,
     )
@@ -30,43 +46,103 @@ def setup_scheduler(cfg: AppConfig, bot: Bot) -> AsyncIOScheduler:
     if cfg.broadcast.autosend_daily_time:
         bh, bm = _parse_hhmm(cfg.broadcast.autosend_daily_time)
         scheduler.add_job(
-            func=_autosend_job,
+            func=autosend,
             trigger="cron",
             hour=bh, minute=bm,
-            args=[cfg, bot],
             id="daily_autosend",
             replace_existing=True,
         )
 
+    if cfg.chat_log.retention_days > 0:
+        rh, rm = _parse_hhmm(cfg.chat_log.retention_time)
+        scheduler.add_job(
+            func=partial(_chat_log_retention, cfg),
+            trigger="cron",
+            hour=rh, minute=rm,
+            id="chat_log_retention",
+            replace_existing=True,
+        )
+
     return scheduler
 
-async def _daily_scrape_full_replace(cfg: AppConfig):
-    Session = get_sessionmaker()
-    items = scrape_products_multi(cfg.scrape.urls, {
-        "card": cfg.scrape.selectors.card,
-        "title": cfg.scrape.selectors.title,
-        "price": cfg.scrape.selectors.price,
-        "link_from_title": cfg.scrape.selectors.link_from_title
-    })
-
-    categorized: dict[str, list[dict]] = {}
-    for it in items:
-        cat_name = pick_category_name(it["title"], cfg.categories) or "Прочее"
-        categorized.setdefault(cat_name, []).append(it)
+async def _chat_log_retention(cfg: AppConfig):
+    n = await prune_chat_logs(get_sessionmaker(), cfg.chat_log.retention_days, cfg.chat_log.retention_batch)
+    log.info("Журнал переписки: удалено записей старше %s дн.: %s", cfg.chat_log.retention_days, n)
 
+async def _daily_scrape_full_replace(cfg: AppConfig) -> SyncStats:
+    Session = get_sessionmaker()
+    timings = StageTimings()
     async with Session() as s:  # type: AsyncSession
-        await replace_all_categories_and_products(s, categorized)
+        stats = await run_catalog_pipeline(cfg, s, timings)
+    catalog_cache.invalidate()
+    log.info("Каталог записан (%s): %s; %s", cfg.scrape.write_mode, stats, timings)
+    return stats
 
-async def _autosend_job(cfg: AppConfig, bot: Bot):
-    from sqlalchemy import select
-    from .models import User
+async def _scrape_tracking_prices(cfg: AppConfig) -> tuple[SyncStats, int, int]:
+    """Парсинг и диапазон (после, до] id записанных за него строк price_history."""
     Session = get_sessionmaker()
     async with Session() as s:
-        res = await s.execute(select(User).where(User.subscribed == True))
-        users = list(res.scalars().all())
-    text = "🔔 Каталог обновлён! Зайдите в бота и посмотрите категории."
-    for u in users:
+        before = await last_history_id(s)
+    stats = await _daily_scrape_full_replace(cfg)
+    async with Session() as s:
+        upto = await last_history_id(s)
+    return stats, before, upto
+
+async def _scrape_and_digest(cfg: AppConfig, bot: Bot) -> SyncStats:
+    """Обновление в одном процессе: парсинг, затем дайджесты изменений цен подписчикам /watch."""
+    stats, before, upto = await _scrape_tracking_prices(cfg)
+    if cfg.broadcast.price_digests and upto > before:
         try:
-            await bot.send_message(u.tg_id, text)
+            log.info("Дайджесты цен: %s", await send_price_digests(cfg, bot, get_sessionmaker(), before, upto))
         except Exception:
-            pass
+            # каталог уже обновлён — ошибка дайджестов не должна выглядеть как ошибка парсинга
+            log.exception("Не удалось разослать дайджесты цен")
+    return stats
+
+async def _autosend_job(cfg: AppConfig, bot: Bot):
+    b = cfg.broadcast
+    broadcaster = Broadcaster(bot, get_sessionmaker(), rate_per_sec=b.rate_per_sec,
+                              per_chat_interval=b.per_chat_interval, concurrency=b.concurrency,
+                              chunk_size=b.chunk_size)
+    stats = await broadcaster.run(AUTOSEND_TEXT, job_id=_autosend_checkpoint(cfg))
+    log.info("Автоотправка: %s", stats)
+    return stats
+
+def _autosend_checkpoint(cfg: AppConfig) -> str:
+    # один job_id на день: перезапуск процесса продолжит рассылку с контрольной точки
+    return f"autosend-{datetime.now(ZoneInfo(cfg.tz)):%Y%m%d}"
+
+async def _enqueue_scrape(Session: async_sessionmaker[AsyncSession]):
+    async with Session() as s:
+        await enqueue_job(s, SCRAPE, dedup_key=SCRAPE)
+
+async def _enqueue_autosend(cfg: AppConfig, Session: async_sessionmaker[AsyncSession]):
+    checkpoint = _autosend_checkpoint(cfg)
+    async with Session() as s:
+        await enqueue_job(s, BROADCAST, {"text": AUTOSEND_TEXT, "checkpoint": checkpoint}, dedup_key=checkpoint)
+
+async def _scrape_job(cfg: AppConfig, job: Job) -> str:
+    stats, before, upto = await _scrape_tracking_prices(cfg)
+    if cfg.broadcast.price_digests and upto > before:
+        # рассылает notifier — scrape-воркер сразу свободен для следующего обновления
+        async with get_sessionmaker()() as s:
+            await enqueue_job(s, DIGEST, {"after": before, "upto": upto}, dedup_key=f"digest-{before}-{upto}")
+    return str(stats)
+
+async def run_scheduler_worker(cfg: AppConfig):
+    """Процесс scheduler супервизора: расписание ставит задачи в jobs, парсинг выполняется здесь же."""
+    engine, Session = init_engine(cfg.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(ensure_indexes, ChatLog.__table__)
+    sup = cfg.supervisor
+    scheduler = setup_scheduler(cfg, partial(_enqueue_scrape, Session), partial(_enqueue_autosend, cfg, Session))
+    worker = JobWorker(Session, {SCRAPE: partial(_scrape_job, cfg)}, name=f"scheduler-{os.getpid()}",
+                       poll_interval=sup.poll_interval, heartbeat_interval=sup.heartbeat_interval,
+                       stale_after=sup.stale_after, max_attempts=sup.max_attempts)
+    scheduler.start()
+    try:
+        await run_until_signal(worker.run_forever())
+    finally:
+        scheduler.shutdown(wait=False)
+        await engine.dispose()
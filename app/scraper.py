@@ -1,73 +1,122 @@
-import re
-from urllib.parse import urljoin, urlparse
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Awaitable, Callable, List, Dict
 
-UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
+from .fetcher import Fetcher
+from .frontier import CrawlFrontier, CrawlStats, ItemDeduper
+from .page_cache import PageCache
+from .parsers import HtmlParser, make_parser, parse_in_process
 
-def _first_sel(el, sels: list[str]):
-    for s in sels:
-        x = el.select_one(s)
-        if x:
-            return x
+def _read_parsed(fetcher: Fetcher, res, parser: HtmlParser):
+    if fetcher.cache is not None and res.unchanged:
+        return fetcher.cache.read_parsed(res.url, parser.fingerprint)
     return None
 
-def _clean_text(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
+def _store_parsed(fetcher: Fetcher, res, parser: HtmlParser, parsed):
+    if fetcher.cache is not None:
+        fetcher.cache.store_parsed(res.url, parser.fingerprint, *parsed)
 
-def _abs(base: str, href: str | None) -> str | None:
-    if not href:
-        return None
-    return urljoin(base, href)
+def _parse_cached(fetcher: Fetcher, res, parser: HtmlParser) -> tuple[List[Dict], List[str]]:
+    parsed = _read_parsed(fetcher, res, parser)
+    if parsed is None:
+        parsed = parser.parse(res.text, res.url)
+        _store_parsed(fetcher, res, parser, parsed)
+    return parsed
 
-def scrape_category(url: str, selectors: dict) -> List[Dict]:
-    seen_pages = set()
-    to_visit = [url]
-    items: List[Dict] = []
+async def _fetch_and_parse(fetcher: Fetcher, page: str, parser: HtmlParser,
+                           pool: Executor | None = None) -> tuple[List[Dict], List[str]]:
+    res = await fetcher.fetch(page)
+    if pool is None:
+        # разбор HTML — CPU-работа, уводим её с event loop бота
+        return await asyncio.to_thread(_parse_cached, fetcher, res, parser)
+    parsed = await asyncio.to_thread(_read_parsed, fetcher, res, parser)
+    if parsed is None:
+        # в пуле процессов разбор разных страниц идёт параллельно, без общего GIL
+        parsed = await asyncio.get_running_loop().run_in_executor(
+            pool, parse_in_process, parser.selectors, parser.name, res.text, res.url)
+        await asyncio.to_thread(_store_parsed, fetcher, res, parser, parsed)
+    return parsed
 
-    while to_visit:
-        page = to_visit.pop(0)
-        if page in seen_pages:
-            continue
-        seen_pages.add(page)
+OnPage = Callable[[List[Dict]], Awaitable[None]]
 
-        r = requests.get(page, timeout=25, headers={"User-Agent": UA})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
+_MAX_IN_FLIGHT = 16  # страниц в загрузке и разборе у scrape_category без общего ограничения
 
-        cards = []
-        for card_sel in selectors["card"]:
-            cards = soup.select(card_sel)
-            if cards:
-                break
+async def scrape_category(fetcher: Fetcher, url: str, parser: HtmlParser, on_page: OnPage | None = None,
+                          pool: Executor | None = None, frontier: CrawlFrontier | None = None,
+                          dedup: ItemDeduper | None = None, slots: asyncio.Semaphore | None = None) -> List[Dict]:
+    """Обходит раздел в ширину: страница качается, как только её нашли, не дожидаясь остальных того же уровня.
 
-        for c in cards:
-            title_el = _first_sel(c, selectors["title"])
-            price_el = _first_sel(c, selectors["price"])
-            if not title_el or not price_el:
-                continue
-            title = _clean_text(title_el.get_text())
-            price = _clean_text(price_el.get_text())
-            href = title_el.get("href")
-            items.append({
-                "title": title,
-                "price": price,
-                "url": _abs(page, href) if selectors.get("link_from_title", True) else None
-            })
+    Адреса канонизируются (CrawlFrontier), поэтому «?page=1», метки кампаний
+    и переставленные параметры не приводят к повторной загрузке. С dedup
+    товары, уже встреченные на других страницах, отбрасываются.
+    С on_page товары каждой страницы отдаются в колбэк сразу после разбора
+    и не накапливаются (функция вернёт пустой список).
+    slots ограничивает число страниц в загрузке и разборе (общий на прогон):
+    адрес берётся из очереди, только когда освобождается место, так что
+    память не растёт с числом найденных страниц.
+    """
+    frontier = frontier if frontier is not None else CrawlFrontier()
+    slots = slots if slots is not None else asyncio.Semaphore(_MAX_IN_FLIGHT)
+    frontier.add(url)
+    pending: set[asyncio.Task] = set()
+    items: List[Dict] = []
 
-        # простая пагинация
-        for a in soup.select("a"):
-            txt = (a.get_text() or "").strip().lower()
-            if re.fullmatch(r"[0-9]{1,3}", txt) or "след" in txt or "next" in txt:
-                nxt = _abs(page, a.get("href"))
-                if nxt and urlparse(nxt).netloc == urlparse(page).netloc and nxt not in seen_pages:
-                    to_visit.append(nxt)
+    try:
+        while frontier or pending:
+            # без своих задач в работе ждём место; иначе берём только свободные и возвращаемся к готовым
+            while frontier and (not pending or not slots.locked()):
+                await slots.acquire()
+                t = asyncio.create_task(_fetch_and_parse(fetcher, frontier.pop(), parser, pool))
+                t.add_done_callback(lambda _: slots.release())
+                pending.add(t)
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                page_items, links = fut.result()
+                frontier.stats.pages += 1
+                if dedup is not None:
+                    page_items = dedup.filter(page_items)
+                if on_page is not None:
+                    await on_page(page_items)
+                else:
+                    items.extend(page_items)
+                frontier.extend(links)
+    finally:
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
 
     return items
 
-def scrape_products_multi(urls: List[str], selectors: dict) -> List[Dict]:
+async def scrape_products_multi(urls: List[str], selectors: dict,
+                                concurrency: int = 8, per_host: int = 4, timeout: float = 25.0,
+                                parser: str = "auto", cache: PageCache | None = None,
+                                on_page: OnPage | None = None, parse_processes: int = 0,
+                                stats: CrawlStats | None = None, max_in_flight: int | None = None) -> List[Dict]:
+    """Парсит все разделы; страницы и товары, общие для нескольких URL, берутся один раз.
+
+    Счётчики страниц и отброшенных дублей пишутся в stats. Одновременно
+    в загрузке и разборе не больше max_in_flight страниц (по умолчанию —
+    вдвое больше соединений) на все разделы.
+    """
+    # один парсер на весь прогон: селекторы компилируются и запоминаются по хостам один раз
+    html_parser = make_parser(selectors, parser)
+    stats = stats if stats is not None else CrawlStats()
+    seen: set = set()
+    dedup = ItemDeduper(stats)
+    slots = asyncio.Semaphore(max_in_flight or 2 * concurrency)
+    pool = (ProcessPoolExecutor(parse_processes, mp_context=multiprocessing.get_context("spawn"))
+            if parse_processes > 0 else None)
+    try:
+        async with Fetcher(concurrency=concurrency, per_host=per_host, timeout=timeout, cache=cache) as fetcher:
+            parts = await asyncio.gather(*(
+                scrape_category(fetcher, u, html_parser, on_page, pool, CrawlFrontier(seen, stats), dedup, slots)
+                for u in urls))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
     out: List[Dict] = []
-    for u in urls:
-        out.extend(scrape_category(u, selectors))
+    for p in parts:
+        out.extend(p)
     return out
@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .catalog_cache import catalog_cache
+from .dynamic_products import list_existing_category_tables
+
+log = logging.getLogger(__name__)
+
+_TOKEN_RX = re.compile(r"[0-9a-zа-я]+")
+# самые частые окончания русских слов: «холодильники» и «холодильника» находят «холодильник»
+_RU_ENDINGS = sorted("""
+    ами ями ого его ому ему ыми ими ией иям иях ах ях ам ям ом ем ов ев ей ой ий ый ая яя ое ее ые ие их ых ую юю
+    а я о е ы и у ю ь
+""".split(), key=len, reverse=True)
+_MIN_STEM = 3
+_PREFIX_MIN = 2          # префиксный поиск — от двух символов
+_PREFIX_EXPAND = 64      # сколько слов словаря максимум подставляем по одному префиксу
+_FUZZY_MIN = 4           # опечатки допускаем в словах от четырёх символов
+_W_EXACT, _W_PREFIX, _W_FUZZY = 1.0, 0.7, 0.5
+
+def _stem(token: str) -> str:
+    if len(token) <= _MIN_STEM or not ("а" <= token[0] <= "я"):
+        return token
+    for end in _RU_ENDINGS:
+        if token.endswith(end) and len(token) - len(end) >= _MIN_STEM:
+            return token[:-len(end)]
+    return token
+
+def tokenize(s: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RX.findall((s or "").lower().replace("ё", "е"))]
+
+def _deletes(term: str) -> Iterable[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+@dataclass
+class SearchHit:
+    table: str
+    title: str
+    price: str
+    url: str | None
+    score: float
+
+class SearchIndex:
+    """Инвертированный индекс названий товаров всех категорий.
+
+    Поиск по слову: точное совпадение основы, продолжение префикса
+    (запрос набирают не до конца) и одна опечатка — через словарь
+    удалений одного символа (схема SymSpell), без перебора всего словаря.
+    Результаты ранжируются по числу совпавших слов запроса и их idf.
+    """
+
+    def __init__(self, docs: List[tuple]):
+        self.docs = docs  # (table, title, price, url)
+        postings: Dict[str, set] = defaultdict(set)
+        for i, (_, title, _, _) in enumerate(docs):
+            for tok in tokenize(title):
+                postings[tok].add(i)
+        self.postings = {t: sorted(ids) for t, ids in postings.items()}
+        self.vocab = sorted(self.postings)
+        self.deletes: Dict[str, List[str]] = defaultdict(list)
+        for term in self.vocab:
+            if len(term) >= _FUZZY_MIN:
+                for d in _deletes(term):
+                    self.deletes[d].append(term)
+        n = max(len(docs), 1)
+        self.idf = {t: math.log(1 + n / len(ids)) for t, ids in self.postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _expand(self, tok: str) -> Dict[str, float]:
+        """Слова словаря, подходящие под слово запроса, с весом совпадения."""
+        found: Dict[str, float] = {}
+        if tok in self.postings:
+            found[tok] = _W_EXACT
+        if len(tok) >= _PREFIX_MIN:
+            i = bisect.bisect_left(self.vocab, tok)
+            for term in self.vocab[i:i + _PREFIX_EXPAND]:
+                if not term.startswith(tok):
+                    break
+                found.setdefault(term, _W_PREFIX)
+        if len(tok) >= _FUZZY_MIN and not found:
+            variants = _deletes(tok)
+            # замена, перестановка или пропущенный в запросе символ: общий вариант с удалением
+            for d in variants | {tok}:
+                for term in self.deletes.get(d, ()):
+                    found.setdefault(term, _W_FUZZY)
+            # лишний символ в запросе: удаление из запроса даёт слово словаря
+            for d in variants:
+                if d in self.postings:
+                    found.setdefault(d, _W_FUZZY)
+        return found
+
+    def search(self, query: str, limit: int = 10) -> List[SearchHit]:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        matched: Dict[int, int] = defaultdict(int)
+        scores: Dict[int, float] = defaultdict(float)
+        for tok in tokens:
+            best: Dict[int, float] = {}
+            for term, w in self._expand(tok).items():
+                ws = w * self.idf[term]
+                for doc in self.postings[term]:
+                    if ws > best.get(doc, 0.0):
+                        best[doc] = ws
+            for doc, ws in best.items():
+                matched[doc] += 1
+                scores[doc] += ws
+        # сначала товары, где нашлись все слова запроса, затем по весу; короткие названия точнее
+        top = heapq.nsmallest(limit, matched, key=lambda d: (-matched[d], -scores[d], len(self.docs[d][1])))
+        return [SearchHit(*self.docs[d], score=round(scores[d], 3)) for d in top]
+
+async def load_search_docs(session: AsyncSession) -> List[tuple]:
+    docs: List[tuple] = []
+    for t in sorted(await list_existing_category_tables(session)):
+        res = await session.execute(text(f'SELECT title, price, url FROM "{t}" ORDER BY id'))
+        docs.extend((t, title, price, url) for title, price, url in res.fetchall())
+    return docs
+
+class SearchService:
+    """Держит индекс текущей версии каталога.
+
+    После публикации (catalog_cache.version изменился) индекс перестраивается
+    в фоне, а до готовности запросы обслуживает предыдущий — поиск не ждёт
+    перестройки, кроме самой первой.
+    """
+
+    def __init__(self):
+        self.index: SearchIndex | None = None
+        self.version = -1
+        self._building: asyncio.Task | None = None
+
+    def refresh(self, Session: async_sessionmaker[AsyncSession]) -> asyncio.Task:
+        if self._building is None or self._building.done():
+            self._building = asyncio.create_task(self._build(Session, catalog_cache.version))
+        return self._building
+
+    async def get(self, Session: async_sessionmaker[AsyncSession]) -> SearchIndex:
+        if self.version != catalog_cache.version:
+            task = self.refresh(Session)
+            if self.index is None:
+                await asyncio.shield(task)
+        return self.index
+
+    async def _build(self, Session: async_sessionmaker[AsyncSession], version: int):
+        t0 = time.perf_counter()
+        async with Session() as s:
+            docs = await load_search_docs(s)
+        # разбор названий — CPU-работа, не держим ею event loop
+        index = await asyncio.to_thread(SearchIndex, docs)
+        self.index, self.version = index, version
+        log.info("Поисковый индекс: %s товаров, %s слов за %.2f с",
+                 len(index), len(index.vocab), time.perf_counter() - t0)
+
+search_service = SearchService()
@@ -0,0 +1,27 @@
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from .config import AppConfig
+
+MSG_LIMIT = 4096  # лимит длины сообщения Telegram
+
+def split_message(blocks: list[str], sep: str = "\n\n", limit: int = MSG_LIMIT) -> list[str]:
+    """Склеивает блоки в сообщения не длиннее limit, не разрывая блоков (обрезается только блок длиннее limit)."""
+    out, cur = [], ""
+    for b in blocks:
+        b = b[:limit]
+        if cur and len(cur) + len(sep) + len(b) > limit:
+            out.append(cur)
+            cur = b
+        else:
+            cur = f"{cur}{sep}{b}" if cur else b
+    if cur:
+        out.append(cur)
+    return out
+
+def make_bot(cfg: AppConfig) -> Bot:
+    """Bot с HTML-разметкой; TELEGRAM_API_URL позволяет направить его на локальный Bot API (или заглушку)."""
+    session = AiohttpSession(api=TelegramAPIServer.from_base(cfg.bot_api_url)) if cfg.bot_api_url else None
+    return Bot(cfg.bot_token, session=session, default=DefaultBotProperties(parse_mode="HTML"))
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from .instrumentation import metrics
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """Приём апдейтов по вебхуку с пулом воркеров.
+
+    HTTP-запрос только проверяет секрет, отбрасывает повторы по update_id
+    и кладёт апдейт в очередь — Telegram получает 200 сразу. Обработку
+    ведут `workers` воркеров через тот же Dispatcher, что и при polling.
+    При переполненной очереди или остановке отвечаем 503, и Telegram
+    повторит доставку. stop() перестаёт принимать апдейты и дожидается
+    обработки уже принятых (не дольше drain_timeout).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str = "/webhook", secret: str | None = None,
+                 workers: int = 16, queue_size: int = 1000, dedup_size: int = 10000,
+                 drain_timeout: float = 30.0):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.dedup_size = dedup_size
+        self.drain_timeout = drain_timeout
+        self.duplicates = 0
+        self.rejected = 0
+        self.latencies: list[float] = []  # сек от приёма до конца обработки, для бенчмарка
+        self._queue: asyncio.Queue[tuple[float, Update]] = asyncio.Queue(maxsize=queue_size)
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._draining = False
+        self._tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+
+    def _is_duplicate(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+        update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        if self._is_duplicate(update.update_id):
+            self.duplicates += 1
+            return web.Response()
+        try:
+            self._queue.put_nowait((time.perf_counter(), update))
+        except asyncio.QueueFull:
+            self._seen.pop(update.update_id, None)  # повтор от Telegram должен пройти
+            self.rejected += 1
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            received, update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                log.exception("Ошибка обработки апдейта %s", update.update_id)
+            finally:
+                self.latencies.append(time.perf_counter() - received)
+                if len(self.latencies) > 100_000:
+                    del self.latencies[:50_000]
+                self._queue.task_done()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def start(self, host: str = "0.0.0.0", port: int = 8080):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        metrics.gauges["shopbot_webhook_queue"] = self._queue.qsize
+        metrics.gauges["shopbot_webhook_duplicates"] = lambda: self.duplicates
+        metrics.gauges["shopbot_webhook_rejected"] = lambda: self.rejected
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        self._draining = True
+        try:
+            await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning("Не дождались обработки %d апдейтов", self._queue.qsize())
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
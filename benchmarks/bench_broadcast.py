@@ -0,0 +1,83 @@
+"""Рассылка через Broadcaster против локальной заглушки Bot API.
+
+Создаёт N подписчиков во временной SQLite-базе (или в --db), часть из них
+«блокирует» бота, и измеряет пропускную способность, число 429 и ошибок.
+--interrupt-after прерывает первую попытку и продолжает её с контрольной
+точки, проверяя, что никто не получил сообщение дважды.
+Запуск из корня репозитория:
+    python -m benchmarks.bench_broadcast [--users 2000] [--rate 25] [--api-limit 30]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+
+from sqlalchemy import delete, func, select
+
+from app.broadcast import Broadcaster
+from app.config import AppConfig
+from app.db import init_engine
+from app.models import Base, BroadcastCheckpoint, User
+from app.telegram import make_bot
+from benchmarks.fake_bot_api import FakeBotApi
+
+async def seed_users(Session, n: int):
+    async with Session() as s:
+        await s.execute(delete(User))
+        await s.execute(delete(BroadcastCheckpoint))
+        s.add_all(User(tg_id=1_000_000 + i, username=None, subscribed=True) for i in range(n))
+        await s.commit()
+
+async def run(args):
+    db_url = args.db or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine, Session = init_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed_users(Session, args.users)
+
+    rnd = random.Random(1)
+    blocked = {1_000_000 + i for i in rnd.sample(range(args.users), int(args.users * args.blocked))}
+    api = FakeBotApi(latency=args.latency, rate_limit=args.api_limit, blocked=blocked)
+    base = await api.start(port=args.port)
+    cfg = AppConfig(scrape=None, categories=[], broadcast=None, bot_token="42:fake", admin_ids=[],
+                    database_url=db_url, tz="UTC", bot_api_url=base)
+    bot = make_bot(cfg)
+    try:
+        make = lambda: Broadcaster(bot, Session, rate_per_sec=args.rate, per_chat_interval=1.0,
+                                   concurrency=args.concurrency, chunk_size=args.chunk)
+        job = "bench"
+        if args.interrupt_after:
+            task = asyncio.create_task(make().run("Бенчмарк", job_id=job))
+            await asyncio.sleep(args.interrupt_after)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            print(f"прервано через {args.interrupt_after}s, доставлено {api.counters['sent']}")
+        stats = await make().run("Бенчмарк", job_id=job)
+        print(stats)
+        async with Session() as s:
+            unsub = (await s.execute(select(func.count()).select_from(User).where(User.subscribed == False))).scalar_one()
+        dup = sum(1 for c in api.delivered.values() if c > 1)
+        print(f"API: доставлено={api.counters['sent']} 429={api.counters['429']} 403={api.counters['403']}; "
+              f"отписано заблокировавших={unsub}/{len(blocked)}; дублей={dup}")
+    finally:
+        await bot.session.close()
+        await api.stop()
+        await engine.dispose()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=None, help="по умолчанию — временная SQLite (нужен aiosqlite)")
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--blocked", type=float, default=0.05, help="доля заблокировавших бота")
+    ap.add_argument("--rate", type=float, default=25.0)
+    ap.add_argument("--api-limit", type=int, default=30)
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--chunk", type=int, default=500)
+    ap.add_argument("--interrupt-after", type=float, default=0.0)
+    ap.add_argument("--port", type=int, default=8081)
+    asyncio.run(run(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Скорость загрузки товаров: старый executemany против copy_rows.
+
+Нужна локальная БД (DATABASE_URL из окружения/.env или --db). Таблица
+bench_products создаётся и удаляется самим бенчмарком.
+Запуск из корня репозитория:
+    python -m benchmarks.bench_bulk_load [--sizes 10000,100000,1000000] [--legacy-max 100000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from app.db import init_engine
+from app.dynamic_products import PRODUCT_COLUMNS, _create_category_table, copy_rows, product_rows
+from benchmarks.synthetic import product_title
+
+TABLE = "bench_products"
+
+def make_items(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    return [{"title": product_title(rnd), "price": f"{rnd.randint(49, 4999)},00 р.",
+             "url": f"https://shop.local/item/{i}/"} for i in range(n)]
+
+async def recreate_table(s):
+    # та же схема и индексы, что у таблиц категорий: загрузка меряется в реальных условиях
+    await s.execute(text(f'DROP TABLE IF EXISTS "{TABLE}"'))
+    await _create_category_table(s, TABLE)
+    await s.commit()
+
+async def load_legacy(s, items):
+    # так писал bulk_insert_products до COPY: словарь и utcnow() на каждую строку
+    from app.dynamic_products import product_ident
+    values = [{"ident": product_ident(it), "title": it["title"], "price": it["price"],
+               "url": it["url"], "updated_at": datetime.utcnow()} for it in items]
+    await s.execute(text(f"""
+        INSERT INTO "{TABLE}" (ident, title, price, url, updated_at)
+        VALUES (:ident, :title, :price, :url, :updated_at)
+    """), values)
+
+async def load_copy(s, items):
+    await copy_rows(s, TABLE, PRODUCT_COLUMNS, product_rows(items))
+
+async def run(db_url: str, sizes: list[int], legacy_max: int):
+    engine, Session = init_engine(db_url)
+    print(f"dialect={engine.dialect.name} driver={engine.dialect.driver}")
+    try:
+        for n in sizes:
+            items = make_items(n)
+            for name, loader in (("executemany", load_legacy), ("copy_rows", load_copy)):
+                if name == "executemany" and n > legacy_max:
+                    print(f"{n:>9,} {name:12s}: пропущено (--legacy-max {legacy_max:,})")
+                    continue
+                async with Session() as s:
+                    await recreate_table(s)
+                    t0 = time.perf_counter()
+                    await loader(s, items)
+                    await s.commit()
+                    dt = time.perf_counter() - t0
+                    cnt = (await s.execute(text(f'SELECT COUNT(*) FROM "{TABLE}"'))).scalar_one()
+                print(f"{n:>9,} {name:12s}: {dt:7.2f}s  {n / dt:>10,.0f} строк/с  (в таблице {cnt:,})")
+        async with Session() as s:
+            await s.execute(text(f'DROP TABLE IF EXISTS "{TABLE}"'))
+            await s.commit()
+    finally:
+        await engine.dispose()
+
+def main():
+    load_dotenv()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=os.getenv("DATABASE_URL"))
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--legacy-max", type=int, default=100_000,
+                    help="старый путь на больших объёмах идёт очень долго")
+    args = ap.parse_args()
+    if not args.db:
+        raise SystemExit("Укажите --db или DATABASE_URL")
+    asyncio.run(run(args.db, [int(x) for x in args.sizes.split(",")], args.legacy_max))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Сравнение Categorizer с pick_category_name на синтетических названиях.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_categorizer [--titles 100000]
+"""
+import argparse
+import random
+import time
+
+import yaml
+
+from app.config import CategoryConf
+from app.categorizer import Categorizer, pick_category_name
+
+NOISE = ["белый", "черный", "2024", "pro", "max", "x100", "inverter", "A++", "led", "smart", "классик", "мини"]
+
+def make_titles(categories: list[CategoryConf], n: int, seed: int = 42) -> list[str]:
+    rnd = random.Random(seed)
+    kws = [k for c in categories for k in c.keywords] or ["товар"]
+    titles = []
+    for _ in range(n):
+        words = rnd.sample(NOISE, 3)
+        if rnd.random() < 0.85:
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(kws).capitalize())
+        titles.append(" ".join(words))
+    return titles
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--titles", type=int, default=100_000)
+    ap.add_argument("--config", default="config.yaml")
+    args = ap.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        categories = [CategoryConf(**c) for c in yaml.safe_load(f).get("categories", [])]
+    titles = make_titles(categories, args.titles)
+
+    t0 = time.perf_counter()
+    old = [pick_category_name(t, categories) for t in titles]
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cat = Categorizer(categories)
+    t_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = cat.categorize_many(titles)
+    t_new = time.perf_counter() - t0
+
+    mismatches = sum(a != b for a, b in zip(old, new))
+    print(f"titles={len(titles)} categories={len(categories)}")
+    print(f"pick_category_name : {t_old:.3f}s ({len(titles) / t_old:,.0f} titles/s)")
+    print(f"Categorizer        : {t_new:.3f}s ({len(titles) / t_new:,.0f} titles/s), сборка {t_build * 1000:.1f}ms")
+    print(f"ускорение x{t_old / t_new:.1f}, расхождений: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Сравнение HTML-бэкендов парсера на сохранённых страницах.
+
+Страницы берутся из benchmarks/fixtures/*.html (URL страницы — имя файла
+на хосте fixtures.local); --synthetic N добавляет N синтетических страниц.
+Запуск из корня репозитория:
+    python -m benchmarks.bench_parsers [--repeat 20]
+"""
+import argparse
+import pathlib
+import re
+import time
+from urllib.parse import urljoin, urlparse
+
+import yaml
+from bs4 import BeautifulSoup
+
+from app.parsers import BACKENDS
+from benchmarks.synthetic import listing_page
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+def legacy_parse(html: str, page: str, selectors: dict):
+    """Разбор в том виде, в каком он был в scrape_category до появления бэкендов."""
+    def first_sel(el, sels):
+        for s in sels:
+            x = el.select_one(s)
+            if x:
+                return x
+        return None
+    clean = lambda s: re.sub(r"\s+", " ", (s or "").strip())
+    soup = BeautifulSoup(html, "html.parser")
+    cards = []
+    for card_sel in selectors["card"]:
+        cards = soup.select(card_sel)
+        if cards:
+            break
+    items = []
+    for c in cards:
+        title_el = first_sel(c, selectors["title"])
+        price_el = first_sel(c, selectors["price"])
+        if not title_el or not price_el:
+            continue
+        href = title_el.get("href")
+        items.append({"title": clean(title_el.get_text()), "price": clean(price_el.get_text()),
+                      "url": urljoin(page, href) if href and selectors.get("link_from_title", True) else None})
+    links = []
+    for a in soup.select("a"):
+        txt = (a.get_text() or "").strip().lower()
+        if re.fullmatch(r"[0-9]{1,3}", txt) or "след" in txt or "next" in txt:
+            href = a.get("href")
+            nxt = urljoin(page, href) if href else None
+            if nxt and urlparse(nxt).netloc == urlparse(page).netloc:
+                links.append(nxt)
+    return items, links
+
+def load_pages(synthetic: int) -> list[tuple[str, str]]:
+    pages = [(f"https://fixtures.local/{p.stem}/", p.read_text(encoding="utf-8"))
+             for p in sorted(FIXTURES.glob("*.html"))]
+    for n in range(synthetic):
+        pages.append((f"https://fixtures.local/synthetic/?page={n + 1}",
+                      listing_page("/synthetic/", n + 1, max(synthetic, 1))))
+    return pages
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--synthetic", type=int, default=0)
+    ap.add_argument("--config", default="config.yaml")
+    args = ap.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        selectors = yaml.safe_load(f)["scrape"]["selectors"]
+    pages = load_pages(args.synthetic)
+    if not pages:
+        raise SystemExit("Нет страниц: положите *.html в benchmarks/fixtures или укажите --synthetic")
+    total_bytes = sum(len(h.encode()) for _, h in pages)
+    print(f"страниц={len(pages)} объём={total_bytes / 1024:.0f} KiB повторов={args.repeat}")
+
+    expected = [legacy_parse(h, url, selectors) for url, h in pages]
+    runners = {"legacy": lambda h, url: legacy_parse(h, url, selectors)}
+    for name, cls in BACKENDS.items():
+        try:
+            parser = cls(selectors)
+        except RuntimeError as e:
+            print(f"{name:12s}: пропущен ({e})")
+            continue
+        runners[name] = parser.parse
+
+    base = None
+    for name, run in runners.items():
+        same = all(run(h, url) == exp for (url, h), exp in zip(pages, expected))
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for url, h in pages:
+                run(h, url)
+        dt = (time.perf_counter() - t0) / args.repeat
+        base = base or dt
+        print(f"{name:12s}: {dt * 1000:8.1f} ms/проход  {len(pages) / dt:8.1f} стр/с  "
+              f"x{base / dt:4.1f}  совпадает с legacy: {'да' if same else 'НЕТ'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Полный прогон парсинг → категоризация → запись против локальной заглушки магазина.
+
+Магазин (benchmarks.catalog_server) запускается отдельным процессом, база —
+временная SQLite (или --db). Первый прогон идёт с пустым кэшем страниц,
+следующие (--runs) — с тёплым: сайт отвечает 304, а запись в режиме sync
+ничего не меняет. Для каждого прогона печатаются страницы/с, товары/с,
+пиковая RSS процесса и время стадий; --out сохраняет результат в JSON,
+--compare сравнивает с ранее сохранённым при тех же параметрах.
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pipeline [--sections 8] [--pages 20] [--window 3] [--runs 2]
+    python -m benchmarks.bench_pipeline --fixtures --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.config import load_config
+from app.db import init_engine
+from app.models import Base
+from app.pipeline import StageTimings, run_catalog_pipeline
+from benchmarks.catalog_server import CatalogServer, serve
+
+_COMPARED = ("pages_per_s", "items_per_s", "peak_rss_mb", "scrape_s", "categorize_s", "write_s", "finish_s", "total_s")
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # macOS — байты, Linux — КиБ
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def start_server(opts: dict, port: int) -> multiprocessing.Process:
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    proc = ctx.Process(target=serve, args=(opts, port, ready), name="catalog-server", daemon=True)
+    proc.start()
+    if not ready.wait(30):
+        proc.kill()
+        raise SystemExit("Заглушка магазина не запустилась за 30 с")
+    return proc
+
+async def run(args, urls: list[str]) -> list[dict]:
+    os.environ["BOT_TOKEN"] = os.getenv("BOT_TOKEN") or "42:fake"  # бот в прогоне не нужен, но конфиг его требует
+    cfg = load_config(args.config)
+    tmp = tempfile.mkdtemp(prefix="bench-pipeline-")
+    cfg.database_url = args.db or f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+    sc = cfg.scrape
+    sc.urls = urls
+    sc.cache_dir = None if args.no_cache else os.path.join(tmp, "pages")
+    sc.write_mode, sc.parser = args.write_mode, args.parser
+    sc.concurrency, sc.per_host = args.concurrency, args.per_host
+    sc.parse_processes = args.parse_processes
+
+    engine, Session = init_engine(cfg.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    print(f"dialect={engine.dialect.name} разделов={len(urls)} запись={sc.write_mode} парсер={sc.parser} "
+          f"кэш страниц={'нет' if sc.cache_dir is None else 'да'}")
+    results = []
+    try:
+        for n in range(args.runs):
+            timings = StageTimings()
+            async with Session() as s:
+                stats = await run_catalog_pipeline(cfg, s, timings)
+            total = timings.total_s or 1e-9
+            r = {"run": n + 1, "cache": "cold" if n == 0 or sc.cache_dir is None else "warm",
+                 **timings.as_dict(),
+                 "pages_per_s": round(timings.pages / total, 1), "items_per_s": round(timings.items / total, 1),
+                 "peak_rss_mb": round(_peak_rss_mb(), 1), "stats": str(stats)}
+            if sc.parse_processes:
+                r["peak_rss_parse_mb"] = round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+            results.append(r)
+            print(f"#{r['run']} ({r['cache']}): {r['pages_per_s']} стр/с, {r['items_per_s']} товаров/с, "
+                  f"RSS {r['peak_rss_mb']} МиБ\n    {timings}\n    {stats}")
+    finally:
+        await engine.dispose()
+    return results
+
+def compare(baseline: dict, current: dict):
+    if baseline["meta"]["params"] != current["meta"]["params"]:
+        print("Внимание: параметры прогона отличаются от базового — сравнение приблизительное")
+    print(f"сравнение с {baseline['meta'].get('commit') or '?'} → {current['meta'].get('commit') or '?'}")
+    for old, new in zip(baseline["runs"], current["runs"]):
+        print(f"#{new['run']} ({new['cache']}):")
+        for k in _COMPARED:
+            a, b = old.get(k), new.get(k)
+            if a is None or b is None:
+                continue
+            delta = f"{(b - a) / a * 100:+.1f}%" if a else "—"
+            print(f"    {k:<14} {a:>10} → {b:<10} {delta}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sections", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=20, help="страниц в разделе")
+    ap.add_argument("--per-page", type=int, default=24)
+    ap.add_argument("--window", type=int, default=0, help="соседних страниц в пагинаторе (глубина обхода); 0 — все")
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--jitter", type=float, default=0.01)
+    ap.add_argument("--fixtures", action="store_true", help="записанные страницы benchmarks/fixtures вместо синтетики")
+    ap.add_argument("--runs", type=int, default=2, help="первый — с пустым кэшем страниц, остальные — с тёплым")
+    ap.add_argument("--write-mode", default="sync", choices=["sync", "swap", "replace"])
+    ap.add_argument("--parser", default="auto")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--per-host", type=int, default=8)
+    ap.add_argument("--parse-processes", type=int, default=0)
+    ap.add_argument("--no-cache", action="store_true", help="без кэша страниц")
+    ap.add_argument("--db", default=None, help="по умолчанию — временная SQLite (нужен aiosqlite)")
+    ap.add_argument("--config", default="config.yaml", help="откуда брать категории и селекторы")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--out", help="сохранить результат в JSON")
+    ap.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = ap.parse_args()
+
+    opts = dict(sections=args.sections, pages=args.pages, per_page=args.per_page, window=args.window or None,
+                latency=args.latency, jitter=args.jitter, fixtures=args.fixtures)
+    urls = [f"http://127.0.0.1:{args.port}{p}" for p in CatalogServer(**opts).paths()]
+    server = start_server(opts, args.port)
+    t0 = time.perf_counter()
+    try:
+        runs = asyncio.run(run(args, urls))
+    finally:
+        server.terminate()
+        server.join()
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "port", "db")}
+    current = {"meta": {"commit": _git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "wall_s": round(time.perf_counter() - t0, 2), "params": params},
+               "runs": runs}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"результат сохранён в {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), current)
+
+if __name__ == "__main__":
+    main()
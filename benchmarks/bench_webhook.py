@@ -0,0 +1,97 @@
+"""Задержка обработки апдейтов в режиме вебхука.
+
+Поднимает бота (BotRuntime + WebhookServer) на временной SQLite-базе,
+направляет его в локальную заглушку Bot API и засыпает вебхук
+сгенерированными апдейтами (часть — повторы, как при ретраях Telegram).
+Печатает p50/p99 от приёма апдейта до конца обработки и пропускную
+способность.
+Запуск из корня репозитория:
+    python -m benchmarks.bench_webhook [--users 200] [--updates 5000] [--workers 16]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import aiohttp
+
+os.environ.setdefault("BOT_TOKEN", "42:fake")
+
+from app.config import load_config
+from app.mainbot_runtime import BotRuntime
+from app.webhook import WebhookServer, SECRET_HEADER
+from benchmarks.fake_bot_api import FakeBotApi
+
+SCRIPT = ["/start", "Тестовый Пользователь", "/start", "🔕 Отписаться", "🔔 Подписаться", "✏️ Изменить имя", "Новое Имя"]
+
+def make_updates(users: int, total: int, dup_ratio: float, seed: int = 3) -> list[dict]:
+    rnd = random.Random(seed)
+    step = {u: 0 for u in range(users)}
+    out = []
+    for update_id in range(1, total + 1):
+        uid = rnd.randrange(users)
+        text = SCRIPT[step[uid] % len(SCRIPT)]
+        step[uid] += 1
+        upd = {"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": 10_000 + uid, "type": "private"},
+            "from": {"id": 10_000 + uid, "is_bot": False, "first_name": "U"}}}
+        out.append(upd)
+        if rnd.random() < dup_ratio:
+            out.append(upd)
+    return out
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def run(args):
+    api = FakeBotApi(latency=args.api_latency, rate_limit=10**9)
+    cfg = load_config()
+    cfg.database_url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    cfg.bot_api_url = await api.start(port=args.api_port)
+    cfg.metrics.port = None
+    rt = BotRuntime(cfg, with_scheduler=False)
+    await rt.start()
+    server = WebhookServer(rt.dp, rt.bot, secret="bench", workers=args.workers, queue_size=args.updates * 2)
+    await server.start("127.0.0.1", args.port)
+
+    updates = make_updates(args.users, args.updates, args.dup)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+    sem = asyncio.Semaphore(args.concurrency)
+    t0 = time.perf_counter()
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: "bench"}) as http:
+        async def post(u):
+            async with sem, http.post(url, json=u) as r:
+                return r.status
+        statuses = await asyncio.gather(*(post(u) for u in updates))
+        accepted = time.perf_counter() - t0
+    await server.stop()
+    total = time.perf_counter() - t0
+    await rt.stop()
+    await api.stop()
+
+    lat = server.latencies
+    print(f"апдейтов={len(updates)} (повторов {server.duplicates}), воркеров={args.workers}, "
+          f"ответы не-200: {sum(s != 200 for s in statuses)}")
+    print(f"приём: {accepted:.2f}s, обработка всего: {total:.2f}s ({len(lat) / total:.0f} апд/с)")
+    print(f"задержка: p50={pct(lat, 0.5) * 1000:.1f}ms p99={pct(lat, 0.99) * 1000:.1f}ms "
+          f"mean={statistics.mean(lat) * 1000 if lat else 0:.1f}ms; отправлено ботом={api.counters['sent']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--updates", type=int, default=5000)
+    ap.add_argument("--dup", type=float, default=0.02, help="доля повторно доставленных апдейтов")
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--concurrency", type=int, default=64, help="одновременных POST на вебхук")
+    ap.add_argument("--api-latency", type=float, default=0.01)
+    ap.add_argument("--port", type=int, default=8088)
+    ap.add_argument("--api-port", type=int, default=8089)
+    asyncio.run(run(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
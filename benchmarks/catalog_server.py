@@ -0,0 +1,115 @@
+"""Локальная заглушка магазина для прогона парсинга без сети.
+
+Синтетический режим отдаёт sections разделов по pages страниц из
+per_page карточек (benchmarks.synthetic); window ограничивает пагинатор
+соседними страницами и задаёт глубину обхода. Режим fixtures отдаёт
+записанные страницы benchmarks/fixtures/*.html по адресу /fixtures/<имя>/
+(на любой ?page= — та же запись, пагинация берётся из её разметки).
+Ответы приходят с задержкой latency ± jitter и с ETag — повторный
+прогон с кэшем страниц получает 304, как от настоящего сайта.
+Отдельно (для ручной отладки парсера):
+    python -m benchmarks.catalog_server [--sections 8] [--pages 20] [--port 8090]
+"""
+import argparse
+import asyncio
+import hashlib
+import pathlib
+import random
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks.synthetic import listing_page
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+class CatalogServer:
+    def __init__(self, sections: int = 8, pages: int = 20, per_page: int = 24, window: int | None = None,
+                 latency: float = 0.02, jitter: float = 0.01, seed: int = 0, fixtures: bool = False):
+        self.sections = sections
+        self.pages = pages
+        self.per_page = per_page
+        self.window = window
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.fixtures = {p.stem: p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("*.html"))} if fixtures else {}
+        self.counters: Counter = Counter()
+        self._rnd = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+
+    def paths(self) -> list[str]:
+        if self.fixtures:
+            return [f"/fixtures/{name}/" for name in self.fixtures]
+        return [f"/section-{i}/" for i in range(self.sections)]
+
+    def _page(self, request: web.Request) -> str | None:
+        if request.match_info.get("name"):
+            return self.fixtures.get(request.match_info["name"])
+        section = int(request.match_info["section"])
+        try:
+            page = int(request.query.get("page", "1"))
+        except ValueError:
+            return None
+        if not (0 <= section < self.sections and 1 <= page <= self.pages):
+            return None
+        return listing_page(f"/section-{section}/", page, self.pages, self.per_page, self.seed, window=self.window)
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        await asyncio.sleep(max(0.0, self.latency + self._rnd.uniform(-self.jitter, self.jitter)))
+        html = self._page(request)
+        if html is None:
+            self.counters["404"] += 1
+            raise web.HTTPNotFound()
+        etag = '"' + hashlib.blake2b(html.encode(), digest_size=8).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            self.counters["304"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        self.counters["200"] += 1
+        return web.Response(text=html, content_type="text/html", headers={"ETag": etag})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8090) -> str:
+        app = web.Application()
+        app.router.add_get("/section-{section:\\d+}/", self._handle)
+        app.router.add_get("/fixtures/{name}/", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+def serve(opts: dict, port: int, ready=None):
+    """Точка входа отдельного процесса: бенчмарк меряет память и CPU конвейера без сервера."""
+    async def main():
+        server = CatalogServer(**opts)
+        await server.start(port=port)
+        if ready is not None:
+            ready.set()
+        await asyncio.Event().wait()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sections", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--per-page", type=int, default=24)
+    ap.add_argument("--window", type=int, default=0, help="соседних страниц в пагинаторе; 0 — все")
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--jitter", type=float, default=0.01)
+    ap.add_argument("--fixtures", action="store_true", help="отдавать записанные страницы вместо синтетики")
+    ap.add_argument("--port", type=int, default=8090)
+    args = ap.parse_args()
+    opts = dict(sections=args.sections, pages=args.pages, per_page=args.per_page, window=args.window or None,
+                latency=args.latency, jitter=args.jitter, fixtures=args.fixtures)
+    for path in CatalogServer(**opts).paths():
+        print(f"http://127.0.0.1:{args.port}{path}")
+    serve(opts, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Локальная заглушка Telegram Bot API для бенчмарков рассылки и вебхука.
+
+Понимает getMe и sendMessage. Эмулирует задержку ответа, общий лимит
+сообщений в секунду (сверх него — 429 с retry_after) и пользователей,
+заблокировавших бота (403). Бот направляется сюда через TELEGRAM_API_URL
+или app.telegram.make_bot с cfg.bot_api_url.
+"""
+import asyncio
+import time
+from collections import Counter
+
+from aiohttp import web
+
+class FakeBotApi:
+    def __init__(self, latency: float = 0.02, rate_limit: int = 30, retry_after: int = 1,
+                 blocked: set[int] | None = None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.blocked = blocked or set()
+        self.counters: Counter = Counter()
+        self.delivered: Counter = Counter()  # chat_id -> сообщений
+        self._window = (0, 0)  # (секунда, отправлено в ней)
+        self._message_id = 0
+        self._runner: web.AppRunner | None = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post()) if request.can_read_body else {}
+        if request.content_type == "application/json":
+            data = await request.json()
+        await asyncio.sleep(self.latency)
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}})
+        if method != "sendMessage":
+            self.counters["unsupported"] += 1
+            return web.json_response({"ok": True, "result": True})
+
+        chat_id = int(data["chat_id"])
+        sec = int(time.monotonic())
+        window_sec, count = self._window
+        count = count + 1 if window_sec == sec else 1
+        self._window = (sec, count)
+        if count > self.rate_limit:
+            self.counters["429"] += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": f"Too Many Requests: retry after {self.retry_after}",
+                                      "parameters": {"retry_after": self.retry_after}}, status=429)
+        if chat_id in self.blocked:
+            self.counters["403"] += 1
+            return web.json_response({"ok": False, "error_code": 403,
+                                      "description": "Forbidden: bot was blocked by the user"}, status=403)
+        self.counters["sent"] += 1
+        self.delivered[chat_id] += 1
+        self._message_id += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": self._message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": data.get("text", "")}})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
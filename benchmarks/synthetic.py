@@ -0,0 +1,45 @@
+"""Синтетические страницы каталога в разметке, похожей на темы beseller."""
+import random
+
+BRANDS = ["Samsung", "LG", "Horizont", "TCL", "Atlant", "Indesit", "Bosch", "Philips", "Xiaomi", "Redmond"]
+KINDS = ["Телевизор", "Холодильник", "Стиральная машина", "Пылесос", "Чайник", "Фен", "Ноутбук",
+         "Водонагреватель", "Посудомоечная машина", "Электроплита", "Телефон", "Радиоприемник"]
+
+def product_title(rnd: random.Random) -> str:
+    return f"{rnd.choice(KINDS)} {rnd.choice(BRANDS)} {rnd.choice('ABCDEFGH')}{rnd.randint(100, 9999)}"
+
+def listing_page(path: str, page: int, pages: int, per_page: int = 24, seed: int = 0,
+                 pager_href: str = "?page={n}", window: int | None = None) -> str:
+    """Страница раздела: шапка с меню, сетка карточек, пагинация, подвал.
+
+    window — сколько соседних номеров показывает пагинатор; без него ссылки
+    есть сразу на все страницы, с ним обход в ширину уходит на pages / window уровней.
+    """
+    rnd = random.Random(f"{seed}:{path}:{page}")
+    menu = "".join(f'<li><a href="/section-{i}/">Раздел {i}</a></li>' for i in range(60))
+    cards = []
+    for i in range(per_page):
+        title = product_title(rnd)
+        rub, kop = rnd.randint(49, 4999), rnd.choice(["00", "50", "90"])
+        rub_txt = f"{rub // 1000} {rub % 1000:03d}" if rub >= 1000 else str(rub)
+        cards.append(f"""
+        <div class="product">
+          <div class="product__image"><a href="{path}item-{page}-{i}/"><img src="/img/{page}-{i}.jpg" alt=""></a></div>
+          <div class="product__title"><a href="{path}item-{page}-{i}/">{title}</a></div>
+          <ul class="product__props"><li>Гарантия: 12 мес.</li><li>Код: {rnd.randint(10000, 99999)}</li></ul>
+          <div class="product__price">{rub_txt},{kop} р.</div>
+          <a class="btn" href="/cart/add/{page}-{i}">В корзину</a>
+        </div>""")
+    lo, hi = (1, pages) if window is None else (max(1, page - window), min(pages, page + window))
+    pager = "".join(f'<a href="{pager_href.format(n=n)}">{n}</a>' for n in range(lo, hi + 1))
+    if page < pages:
+        pager += f'<a href="{pager_href.format(n=page + 1)}">След.</a>'
+    footer = "".join(f'<a href="/info/{i}">Информация {i}</a>' for i in range(40))
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Каталог — страница {page}</title></head>
+<body>
+<header><nav><ul>{menu}</ul></nav></header>
+<main><div class="catalog">{''.join(cards)}</div>
+<div class="pagination">{pager}</div></main>
+<footer>{footer}</footer>
+</body></html>"""
@@ -1,32 +1,113 @@
+import html
+import re
 from aiogram import Router, F
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
+from aiogram.exceptions import TelegramBadRequest
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
 
 from app.repositories import (
-    get_or_create_user, set_user_name, set_subscribed, log_message
+    get_or_create_user, set_user_name, set_subscribed
+)
+from app.dynamic_products import (
+    list_existing_category_tables, latest_per_category, PRODUCTS_PREFIX, table_name_for_category,
+    cheapest, in_price_range, under_price, pretty_cat_from_table, product_ident, category_page, count_products
+)
+from app.prices import parse_amount, format_price
+from app.search import search_service
+from app.price_watch import CATEGORY, PRODUCT, MAX_WATCHES, add_watch, remove_watch, list_watches
+from app.db import get_sessionmaker
+from app.catalog_cache import catalog_cache
+from app.refresh import RefreshQueue, JobRefreshQueue
+from app.telegram import MSG_LIMIT, split_message
+from .keyboards import (
+    main_kb, PriceCb, price_categories_kb, price_actions_kb, WatchCb, watch_candidates_kb, watches_kb,
+    CategoryPageCb, category_pager_kb
 )
-from app.dynamic_products import list_existing_category_tables, PRODUCTS_PREFIX, table_name_for_category
-from .keyboards import main_kb
 
 router = Router()
 
+PAGE_SIZE = 10    # товаров на странице категории
+
 class NameState(StatesGroup):
     waiting = State()
 
 class CatState(StatesGroup):
     waiting = State()
 
-def pretty_cat_from_table(t: str) -> str:
-    return t[len(PRODUCTS_PREFIX):].replace("_", " ").title()
+class SearchState(StatesGroup):
+    waiting = State()
+
+class PriceState(StatesGroup):
+    under = State()
+    range = State()
+
+async def _cached_tables(session: AsyncSession) -> list[str]:
+    return await catalog_cache.get("tables", lambda: list_existing_category_tables(session))
+
+def _render_item(title, price, url) -> str:
+    # названия и цены приходят с сайта как есть, а сообщения идут с HTML-разметкой
+    part = f"• <b>{html.escape(title)}</b>\n   Цена: {html.escape(price)}"
+    if url: part += f"\n   {html.escape(url)}"
+    return part
+
+async def _answer_parts(message: Message, parts: list[str]):
+    for part in parts:
+        await message.answer(part)
+
+async def _render_last_from_all(session: AsyncSession, tables: list[str]) -> list[str]:
+    latest = await latest_per_category(session, sorted(tables), 5)
+    blocks = []
+    for t, rows in latest.items():
+        if rows:
+            # длинная категория сама делится по товарам, заголовок остаётся с первым из них
+            blocks += split_message([f"🔹 <b>{pretty_cat_from_table(t)}</b>"] + [_render_item(*r) for r in rows], "\n")
+    return split_message(blocks) or ["Товаров нет."]
+
+async def _render_category_page(session: AsyncSession, tname: str, direction: str, cursor: int) -> tuple[str, int | None, int | None]:
+    """Страница категории: (текст, курсор «новее», курсор «старше»); курсор None — дальше ничего нет.
+
+    direction n — товары старше cursor (0 — с начала), p — новее cursor.
+    На страницу идёт не больше PAGE_SIZE товаров и не больше, чем влезает в
+    одно сообщение; следующая страница начинается с первого не влезшего.
+    """
+    total = await catalog_cache.get(("count", tname), lambda: count_products(session, tname))
+    if direction == "p":
+        rows = await category_page(session, tname, after_id=cursor, limit=PAGE_SIZE + 1)
+        has_newer, has_older = len(rows) > PAGE_SIZE, True
+        rows = rows[-PAGE_SIZE:]
+    else:
+        rows = await category_page(session, tname, before_id=cursor or None, limit=PAGE_SIZE + 1)
+        has_newer, has_older = cursor != 0, len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+    if not rows:
+        return "Товаров нет.", None, None
+    header = f"Категория: <b>{pretty_cat_from_table(tname)}</b> · товаров: {total}"
+    size, shown = len(header), []
+    # при движении назад ближе к курсору — последние строки, их и сохраняем
+    for r in (reversed(rows) if direction == "p" else rows):
+        item = _render_item(*r[1:])
+        if shown and size + 2 + len(item) > MSG_LIMIT:
+            break
+        size += 2 + len(item)
+        shown.append((r[0], item))
+    if len(shown) < len(rows):
+        has_newer, has_older = (True, has_older) if direction == "p" else (has_newer, True)
+    if direction == "p":
+        shown.reverse()
+    body = "\n\n".join([header] + [item for _, item in shown])[:MSG_LIMIT]
+    return body, shown[0][0] if has_newer else None, shown[-1][0] if has_older else None
+
+async def _category_page(session: AsyncSession, tname: str, direction: str = "n", cursor: int = 0):
+    body, newer, older = await catalog_cache.get(
+        ("category_page", tname, direction, cursor), lambda: _render_category_page(session, tname, direction, cursor))
+    return body, category_pager_kb(tname, newer, older)
 
 @router.message(CommandStart())
 async def start(message: Message, state: FSMContext, session: AsyncSession):
     u = await get_or_create_user(session, message.from_user.id, message.from_user.username)
-    await log_message(session, message.from_user.id, "in", message.text or "")
     if not u.display_name:
         await message.answer("Привет! Напишите, как к вам обращаться.")
         await state.set_state(NameState.waiting)
@@ -45,26 +126,14 @@ async def set_name(message: Message, state: FSMContext, session: AsyncSession):
 
 @router.message(F.text == "🛒 Показать товары")
 async def show_last_from_all(message: Message, session: AsyncSession):
-    tables = await list_existing_category_tables(session)
+    tables = await _cached_tables(session)
     if not tables:
         return await message.answer("Каталог пуст. Нажмите «🔁 Обновить каталог (парсинг)».")
-    lines = []
-    for t in sorted(tables):
-        res = await session.execute(text(f'SELECT title, price, url FROM "{t}" ORDER BY id DESC LIMIT 5'))
-        rows = res.fetchall()
-        if not rows:
-            continue
-        lines.append(f"🔹 <b>{pretty_cat_from_table(t)}</b>")
-        for title, price, url in rows:
-            part = f"• <b>{title}</b>\n   Цена: {price}"
-            if url: part += f"\n   {url}"
-            lines.append(part)
-        lines.append("")
-    await message.answer("\n".join(lines)[:4096] if lines else "Товаров нет.")
+    await _answer_parts(message, await catalog_cache.get("last_from_all", lambda: _render_last_from_all(session, tables)))
 
 @router.message(F.text == "📂 Показать по категории")
 async def ask_category(message: Message, state: FSMContext, session: AsyncSession):
-    tables = await list_existing_category_tables(session)
+    tables = await _cached_tables(session)
     if not tables:
         return await message.answer("Каталог пуст.")
     cats = [pretty_cat_from_table(t) for t in sorted(tables)]
@@ -76,19 +145,22 @@ async def show_by_category(message: Message, state: FSMContext, session: AsyncSe
     name = (message.text or "").strip()
     await state.clear()
     tname = table_name_for_category(name)
-    tables = await list_existing_category_tables(session)
-    if tname not in tables:
+    if tname not in await _cached_tables(session):
         return await message.answer("Такой категории нет.")
-    res = await session.execute(text(f'SELECT title, price, url FROM "{tname}" ORDER BY id DESC LIMIT 20'))
-    rows = res.fetchall()
-    if not rows:
-        return await message.answer("Товаров нет.")
-    lines = [f"Категория: <b>{name}</b>", ""]
-    for title, price, url in rows:
-        part = f"• <b>{title}</b>\n   Цена: {price}"
-        if url: part += f"\n   {url}"
-        lines.append(part)
-    await message.answer("\n\n".join(lines)[:4096])
+    body, kb = await _category_page(session, tname)
+    await message.answer(body, reply_markup=kb)
+
+@router.callback_query(CategoryPageCb.filter())
+async def category_page_callback(call: CallbackQuery, callback_data: CategoryPageCb, session: AsyncSession):
+    tname = PRODUCTS_PREFIX + callback_data.cat
+    if tname not in await _cached_tables(session):
+        return await call.answer("Категория больше не существует", show_alert=True)
+    body, kb = await _category_page(session, tname, callback_data.d, callback_data.id)
+    await call.answer()
+    try:
+        await call.message.edit_text(body, reply_markup=kb)
+    except TelegramBadRequest:
+        pass  # двойное нажатие: страница не изменилась
 
 @router.message(F.text == "✏️ Изменить имя")
 async def rename(message: Message, state: FSMContext):
@@ -106,13 +178,228 @@ async def unsub(message: Message, session: AsyncSession):
     await message.answer("Вы отписались от авторассылки ❌")
 
 @router.message(F.text == "🔁 Обновить каталог (парсинг)")
-async def manual_refresh(message: Message, session: AsyncSession):
-    from app.scheduler import _daily_scrape_full_replace
-    from app.config import load_config
-    await message.answer("⏳ Обновляем каталог (полная замена)…")
-    try:
-        cfg = load_config()
-        await _daily_scrape_full_replace(cfg)
-        await message.answer("Готово! Каталог обновлён.")
-    except Exception:
-        await message.answer("Ошибка при обновлении. Проверьте config.yaml.")
+async def manual_refresh(message: Message, refresh_queue: RefreshQueue | JobRefreshQueue):
+    joined = await refresh_queue.request(message.chat.id)
+    if joined:
+        await message.answer("⏳ Каталог уже обновляется — пришлю сообщение, когда закончится.")
+    else:
+        await message.answer("⏳ Обновляем каталог… Пришлю сообщение, когда закончится.")
+
+# --- подбор по цене: выборки по индексу (price_value, id) ---
+
+_MAX_CHEAPEST = 20
+
+def _render_price_list(title: str, rows: list[tuple]) -> list[str]:
+    if not rows:
+        return [f"{title}\n\nПодходящих товаров нет."]
+    return split_message([title] + [_render_item(*r) for r in rows])
+
+_RANGE_SEP = re.compile(r"\s*(?:-|–|—|\.\.|\bдо\b)\s*")
+
+def _parse_range(text: str):
+    """«200-500», «от 200 до 500», «200 500» → (меньшая, большая) или None."""
+    text = (text or "").strip()
+    parts = [p for p in _RANGE_SEP.split(text) if p]
+    if len(parts) != 2:
+        parts = text.split()
+    if len(parts) != 2:
+        return None
+    lo, hi = parse_amount(parts[0]), parse_amount(parts[1])
+    if lo is None or hi is None:
+        return None
+    return (lo, hi) if lo <= hi else (hi, lo)
+
+async def _price_cats(session: AsyncSession) -> list[tuple[str, str]]:
+    return [(t, pretty_cat_from_table(t)) for t in sorted(await _cached_tables(session))]
+
+async def _answer_price_query(message: Message, session: AsyncSession, tname: str, action: str, a: str, b: str):
+    name = pretty_cat_from_table(tname)
+    if action == "cheap":
+        n = max(1, min(int(a or 5), _MAX_CHEAPEST))
+        rows = await catalog_cache.get(("cheapest", tname, n), lambda: cheapest(session, tname, n))
+        await _answer_parts(message, _render_price_list(f"Категория: <b>{name}</b> — {n} самых дешёвых", rows))
+    elif action == "under":
+        hi = parse_amount(a)
+        rows = await under_price(session, tname, hi)
+        await _answer_parts(message, _render_price_list(f"Категория: <b>{name}</b> — до {format_price(hi)}", rows))
+    elif action == "range":
+        lo, hi = parse_amount(a), parse_amount(b)
+        rows = await in_price_range(session, tname, lo, hi)
+        await _answer_parts(message, _render_price_list(
+            f"Категория: <b>{name}</b> — от {format_price(lo)} до {format_price(hi)}", rows))
+
+@router.message(F.text == "💰 Подбор по цене")
+async def price_menu(message: Message, session: AsyncSession):
+    cats = await _price_cats(session)
+    if not cats:
+        return await message.answer("Каталог пуст.")
+    await message.answer("Выберите категорию:", reply_markup=price_categories_kb(cats))
+
+@router.message(Command("cheapest"))
+async def cmd_cheapest(message: Message, command: CommandObject, session: AsyncSession):
+    n = (command.args or "").strip() or "5"
+    if not n.isdigit():
+        return await message.answer("Формат: /cheapest [N], например /cheapest 10")
+    cats = await _price_cats(session)
+    if not cats:
+        return await message.answer("Каталог пуст.")
+    await message.answer("Выберите категорию:", reply_markup=price_categories_kb(cats, "cheap", n))
+
+@router.message(Command("under"))
+async def cmd_under(message: Message, command: CommandObject, session: AsyncSession):
+    hi = parse_amount(command.args or "")
+    if hi is None:
+        return await message.answer("Формат: /under СУММА, например /under 500")
+    cats = await _price_cats(session)
+    if not cats:
+        return await message.answer("Каталог пуст.")
+    await message.answer(f"Товары до {format_price(hi)}. Выберите категорию:",
+                         reply_markup=price_categories_kb(cats, "under", str(hi)))
+
+@router.message(Command("range"))
+async def cmd_range(message: Message, command: CommandObject, session: AsyncSession):
+    rng = _parse_range(command.args or "")
+    if rng is None:
+        return await message.answer("Формат: /range ОТ ДО, например /range 200 500")
+    cats = await _price_cats(session)
+    if not cats:
+        return await message.answer("Каталог пуст.")
+    await message.answer(f"Товары от {format_price(rng[0])} до {format_price(rng[1])}. Выберите категорию:",
+                         reply_markup=price_categories_kb(cats, "range", str(rng[0]), str(rng[1])))
+
+@router.callback_query(PriceCb.filter())
+async def price_callback(call: CallbackQuery, callback_data: PriceCb, state: FSMContext, session: AsyncSession):
+    tname = PRODUCTS_PREFIX + callback_data.cat
+    if tname not in await _cached_tables(session):
+        return await call.answer("Категория больше не существует", show_alert=True)
+    action = callback_data.action
+    await call.answer()
+    if action == "menu":
+        await call.message.edit_text(f"Категория: <b>{pretty_cat_from_table(tname)}</b>. Что показать?",
+                                     reply_markup=price_actions_kb(tname))
+    elif action == "ask_under":
+        await state.set_state(PriceState.under)
+        await state.update_data(price_table=tname)
+        await call.message.answer("Введите максимальную цену, например: 500")
+    elif action == "ask_range":
+        await state.set_state(PriceState.range)
+        await state.update_data(price_table=tname)
+        await call.message.answer("Введите диапазон цен, например: 200-500")
+    elif action == "watch":
+        await _answer_watch_added(call.message, await add_watch(
+            session, call.from_user.id, CATEGORY, tname, pretty_cat_from_table(tname)), pretty_cat_from_table(tname))
+    else:
+        await _answer_price_query(call.message, session, tname, action, callback_data.a, callback_data.b)
+
+@router.message(PriceState.under)
+async def price_under_input(message: Message, state: FSMContext, session: AsyncSession):
+    hi = parse_amount(message.text or "")
+    if hi is None:
+        return await message.answer("Не понял сумму. Введите число, например: 500")
+    tname = (await state.get_data()).get("price_table")
+    await state.clear()
+    await _answer_price_query(message, session, tname, "under", str(hi), "")
+
+@router.message(PriceState.range)
+async def price_range_input(message: Message, state: FSMContext, session: AsyncSession):
+    rng = _parse_range(message.text or "")
+    if rng is None:
+        return await message.answer("Не понял диапазон. Введите две суммы, например: 200-500")
+    tname = (await state.get_data()).get("price_table")
+    await state.clear()
+    await _answer_price_query(message, session, tname, "range", str(rng[0]), str(rng[1]))
+
+# --- поиск по всем категориям ---
+
+async def _answer_search(message: Message, query: str):
+    index = await search_service.get(get_sessionmaker())
+    hits = index.search(query, 10) if index is not None else []
+    if not hits:
+        return await message.answer("Ничего не нашлось. Попробуйте другое слово или часть названия.")
+    lines = [f"🔍 Результаты по запросу «{html.escape(query)}»:", ""]
+    for h in hits:
+        lines.append(_render_item(h.title, h.price, h.url) + f"\n   <i>{html.escape(pretty_cat_from_table(h.table))}</i>")
+    await _answer_parts(message, split_message(lines))
+
+@router.message(F.text == "🔍 Поиск")
+async def search_prompt(message: Message, state: FSMContext):
+    await message.answer("Что ищем? Введите название или его часть, например: «чайник bosch».")
+    await state.set_state(SearchState.waiting)
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext):
+    if not (command.args or "").strip():
+        return await search_prompt(message, state)
+    await _answer_search(message, command.args.strip())
+
+@router.message(SearchState.waiting)
+async def search_input(message: Message, state: FSMContext):
+    query = (message.text or "").strip()
+    if not query:
+        return await message.answer("Введите текст запроса.")
+    await state.clear()
+    await _answer_search(message, query)
+
+# --- слежение за ценами: дайджесты присылает планировщик/notifier после парсинга ---
+
+_KIND_CODES = {CATEGORY: "c", PRODUCT: "p"}
+
+async def _answer_watch_added(message: Message, status: str, title: str):
+    title = html.escape(title)
+    if status == "added":
+        await message.answer(f"🔔 Сообщу, когда изменятся цены: <b>{title}</b>.\nСписок подписок — /watches")
+    elif status == "exists":
+        await message.answer(f"Вы уже следите: <b>{title}</b>.")
+    else:
+        await message.answer(f"Можно следить не больше чем за {MAX_WATCHES} категориями и товарами. Лишние удалите в /watches.")
+
+@router.message(Command("watch"))
+async def cmd_watch(message: Message, command: CommandObject, state: FSMContext, session: AsyncSession):
+    query = (command.args or "").strip()
+    if not query:
+        cats = await _price_cats(session)
+        if not cats:
+            return await message.answer("Каталог пуст.")
+        return await message.answer("За ценами какой категории следить? Для отдельного товара: /watch название",
+                                    reply_markup=price_categories_kb(cats, "watch"))
+    index = await search_service.get(get_sessionmaker())
+    hits = index.search(query, 5) if index is not None else []
+    if not hits:
+        return await message.answer("Ничего не нашлось. Попробуйте другое слово или часть названия.")
+    candidates = {product_ident({"url": h.url, "title": h.title}): h.title for h in hits}
+    # callback_data вмещает только ident — названия ждут нажатия в данных FSM
+    await state.update_data(watch_candidates=candidates)
+    await message.answer("За каким товаром следить?", reply_markup=watch_candidates_kb(list(candidates.items())))
+
+def _render_watches(watches) -> str:
+    if not watches:
+        return "Вы ни за чем не следите. Категорию или товар можно добавить командой /watch."
+    lines = ["🔔 Вы следите за ценами:", ""]
+    lines += [f"{'📂' if w.kind == CATEGORY else '•'} {html.escape(w.title)}" for w in watches]
+    lines += ["", "Нажмите на кнопку, чтобы перестать следить."]
+    return "\n".join(lines)
+
+def _watches_markup(watches):
+    return watches_kb([(_KIND_CODES[w.kind], w.target[len(PRODUCTS_PREFIX):] if w.kind == CATEGORY else w.target, w.title)
+                       for w in watches])
+
+@router.message(Command("watches"))
+async def cmd_watches(message: Message, session: AsyncSession):
+    watches = await list_watches(session, message.from_user.id)
+    await message.answer(_render_watches(watches), reply_markup=_watches_markup(watches) if watches else None)
+
+@router.callback_query(WatchCb.filter())
+async def watch_callback(call: CallbackQuery, callback_data: WatchCb, state: FSMContext, session: AsyncSession):
+    kind = CATEGORY if callback_data.kind == "c" else PRODUCT
+    target = PRODUCTS_PREFIX + callback_data.target if kind == CATEGORY else callback_data.target
+    if callback_data.action == "add":
+        title = (await state.get_data()).get("watch_candidates", {}).get(target)
+        if title is None:
+            return await call.answer("Список устарел — повторите /watch", show_alert=True)
+        await call.answer()
+        await _answer_watch_added(call.message, await add_watch(session, call.from_user.id, kind, target, title), title)
+    elif callback_data.action == "del":
+        await remove_watch(session, call.from_user.id, kind, target)
+        await call.answer("Больше не слежу")
+        watches = await list_watches(session, call.from_user.id)
+        await call.message.edit_text(_render_watches(watches), reply_markup=_watches_markup(watches) if watches else None)
@@ -1,11 +1,76 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+
+from app.dynamic_products import PRODUCTS_PREFIX
 
 def main_kb(subscribed: bool) -> ReplyKeyboardMarkup:
     rows = [
-        [KeyboardButton(text="🛒 Показать товары")],
+        [KeyboardButton(text="🛒 Показать товары"), KeyboardButton(text="🔍 Поиск")],
         [KeyboardButton(text="📂 Показать по категории")],
+        [KeyboardButton(text="💰 Подбор по цене")],
         [KeyboardButton(text="✏️ Изменить имя")],
         [KeyboardButton(text="🔁 Обновить каталог (парсинг)")],
     ]
     rows.append([KeyboardButton(text="🔕 Отписаться")]) if subscribed else rows.append([KeyboardButton(text="🔔 Подписаться")])
     return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True)
+
+class PriceCb(CallbackData, prefix="pq"):
+    """Запрос по цене: action — menu/cheap/under/range/ask_under/ask_range,
+    cat — таблица без префикса products_ (лимит callback_data — 64 байта), a/b — суммы."""
+    action: str
+    cat: str
+    a: str = ""
+    b: str = ""
+
+def price_categories_kb(cats: list[tuple[str, str]], action: str = "menu", a: str = "", b: str = "") -> InlineKeyboardMarkup:
+    """cats — пары (таблица, название для кнопки)."""
+    rows = [
+        [InlineKeyboardButton(text=name, callback_data=PriceCb(action=action, cat=t[len(PRODUCTS_PREFIX):], a=a, b=b).pack())]
+        for t, name in cats
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def price_actions_kb(table: str) -> InlineKeyboardMarkup:
+    cat = table[len(PRODUCTS_PREFIX):]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔽 5 самых дешёвых", callback_data=PriceCb(action="cheap", cat=cat, a="5").pack())],
+        [InlineKeyboardButton(text="💵 Дешевле суммы…", callback_data=PriceCb(action="ask_under", cat=cat).pack())],
+        [InlineKeyboardButton(text="↔️ Цена от и до…", callback_data=PriceCb(action="ask_range", cat=cat).pack())],
+        [InlineKeyboardButton(text="🔔 Следить за ценами", callback_data=PriceCb(action="watch", cat=cat).pack())],
+    ])
+
+class WatchCb(CallbackData, prefix="wt"):
+    """Подписка на цены: action — add/del, kind — c (категория, target без products_) или p (товар, target — ident)."""
+    action: str
+    kind: str
+    target: str
+
+def watch_candidates_kb(candidates: list[tuple[str, str]]) -> InlineKeyboardMarkup:
+    """candidates — пары (ident, название) из поиска."""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"🔔 {title[:48]}", callback_data=WatchCb(action="add", kind="p", target=ident).pack())]
+        for ident, title in candidates
+    ])
+
+def watches_kb(watches: list[tuple[str, str, str]]) -> InlineKeyboardMarkup:
+    """watches — (kind c/p, target, название); кнопка снимает подписку."""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"❌ {title[:48]}", callback_data=WatchCb(action="del", kind=kind, target=target).pack())]
+        for kind, target, title in watches
+    ])
+
+class CategoryPageCb(CallbackData, prefix="cp"):
+    """Страница категории: d — n (товары старше id, 0 — с начала) или p (новее id)."""
+    cat: str
+    d: str
+    id: int
+
+def category_pager_kb(table: str, newer_id: int | None, older_id: int | None) -> InlineKeyboardMarkup | None:
+    cat = table[len(PRODUCTS_PREFIX):]
+    row = []
+    if newer_id is not None:
+        row.append(InlineKeyboardButton(text="⏮", callback_data=CategoryPageCb(cat=cat, d="n", id=0).pack()))
+        row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=CategoryPageCb(cat=cat, d="p", id=newer_id).pack()))
+    if older_id is not None:
+        row.append(InlineKeyboardButton(text="Дальше ➡️", callback_data=CategoryPageCb(cat=cat, d="n", id=older_id).pack()))
+    return InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
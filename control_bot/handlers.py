@@ -0,0 +1,52 @@
+import html
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.jobs import recent_jobs
+from app.refresh import RefreshQueue, JobRefreshQueue
+from .keyboards import jobs_kb
+
+# служебные команды для админов (ADMIN_IDS): состояние фоновых задач воркеров
+router = Router()
+
+def _is_admin(event: Message | CallbackQuery, admin_ids: set[int]) -> bool:
+    return event.from_user is not None and event.from_user.id in admin_ids
+
+router.message.filter(_is_admin)
+router.callback_query.filter(_is_admin)
+
+_STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌"}
+
+async def _render_jobs(session: AsyncSession) -> str:
+    jobs = await recent_jobs(session, 10)
+    if not jobs:
+        return "Фоновых задач ещё не было."
+    lines = ["<b>Последние задачи</b>", ""]
+    for j in jobs:
+        when = (j.finished_at or j.started_at or j.created_at).strftime("%d.%m %H:%M")
+        lines.append(f"{_STATUS_ICONS.get(j.status, '•')} #{j.id} {j.kind} — {j.status}, {when}, попыток {j.attempts}")
+        if j.result:
+            # в тексте ошибки бывают repr вида <...>, сообщение идёт с HTML-разметкой
+            lines.append(f"   {html.escape(j.result[:200])}")
+    return "\n".join(lines)
+
+@router.message(Command("jobs"))
+async def jobs(message: Message, session: AsyncSession):
+    await message.answer(await _render_jobs(session), reply_markup=jobs_kb())
+
+@router.callback_query(F.data == "jobs:refresh")
+async def jobs_refresh(call: CallbackQuery, session: AsyncSession):
+    try:
+        await call.message.edit_text(await _render_jobs(session), reply_markup=jobs_kb())
+    except TelegramBadRequest:  # ничего не изменилось
+        pass
+    await call.answer()
+
+@router.callback_query(F.data == "jobs:scrape")
+async def jobs_scrape(call: CallbackQuery, refresh_queue: RefreshQueue | JobRefreshQueue):
+    joined = await refresh_queue.request(call.message.chat.id)
+    await call.answer("Парсинг уже идёт" if joined else "Парсинг поставлен в очередь")
@@ -0,0 +1,7 @@
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+def jobs_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Обновить список", callback_data="jobs:refresh")],
+        [InlineKeyboardButton(text="🔁 Запустить парсинг", callback_data="jobs:scrape")],
+    ])
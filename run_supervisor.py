@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+
+from app.config import load_config
+
+log = logging.getLogger("supervisor")
+
+ROLES = ("bot", "scheduler", "notifier")
+
+def _worker_main(role: str, webhook: bool):
+    """Точка входа дочернего процесса: у каждой роли свой event loop и свои подключения к БД."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [{role}] %(levelname)s %(name)s: %(message)s")
+    cfg = load_config()
+    if role == "bot":
+        from app.mainbot_runtime import run_bot
+        asyncio.run(run_bot(cfg, webhook=webhook, supervised=True))
+    elif role == "scheduler":
+        from app.scheduler import run_scheduler_worker
+        asyncio.run(run_scheduler_worker(cfg))
+    elif role == "notifier":
+        from app.notifier import run_notifier_worker
+        asyncio.run(run_notifier_worker(cfg))
+    else:
+        raise ValueError(f"Неизвестная роль: {role}")
+
+class Worker:
+    def __init__(self, role: str):
+        self.role = role
+        self.proc: multiprocessing.Process | None = None
+        self.started_at = 0.0
+        self.restart_at = 0.0
+        self.delay = 0.0
+
+class Supervisor:
+    """Запускает роли отдельными процессами и перезапускает упавшие.
+
+    Пауза перед перезапуском удваивается от restart_delay до restart_delay_max
+    и сбрасывается, если воркер успел проработать stable_after секунд.
+    Процессы ничего не передают друг другу напрямую — только через БД (таблица jobs).
+    """
+
+    def __init__(self, roles: list[str], webhook: bool, restart_delay: float, restart_delay_max: float,
+                 stable_after: float, stop_timeout: float):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers = [Worker(r) for r in roles]
+        self.webhook = webhook
+        self.restart_delay = restart_delay
+        self.restart_delay_max = restart_delay_max
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self._stopping = False
+
+    def _start(self, w: Worker):
+        w.proc = self.ctx.Process(target=_worker_main, args=(w.role, self.webhook), name=f"shopbot-{w.role}")
+        w.proc.start()
+        w.started_at = time.monotonic()
+        log.info("%s запущен (pid %s)", w.role, w.proc.pid)
+
+    def _check(self, w: Worker, now: float):
+        if w.proc is not None:
+            if w.proc.is_alive():
+                return
+            code = w.proc.exitcode
+            w.proc = None
+            if now - w.started_at >= self.stable_after:
+                w.delay = self.restart_delay
+            else:
+                w.delay = min(max(w.delay * 2, self.restart_delay), self.restart_delay_max)
+            w.restart_at = now + w.delay
+            log.warning("%s завершился с кодом %s, перезапуск через %.0f с", w.role, code, w.delay)
+        elif now >= w.restart_at and not self._stopping:
+            self._start(w)
+
+    def _request_stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        for w in self.workers:
+            self._start(w)
+        while not self._stopping:
+            now = time.monotonic()
+            for w in self.workers:
+                self._check(w, now)
+            time.sleep(0.5)
+        self._shutdown()
+
+    def _shutdown(self):
+        alive = [w.proc for w in self.workers if w.proc is not None and w.proc.is_alive()]
+        log.info("Остановка воркеров: %s", ", ".join(p.name for p in alive) or "—")
+        for p in alive:
+            p.terminate()  # SIGTERM: воркеры дорабатывают текущие апдейты и возвращают задачи в очередь
+        deadline = time.monotonic() + self.stop_timeout
+        for p in alive:
+            p.join(max(0.0, deadline - time.monotonic()))
+            if p.is_alive():
+                log.warning("%s не остановился за %.0f с — kill", p.name, self.stop_timeout)
+                p.kill()
+                p.join()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Бот, планировщик/парсинг и рассылки отдельными процессами")
+    ap.add_argument("--roles", help=f"через запятую из {', '.join(ROLES)}; по умолчанию — supervisor.roles из config.yaml")
+    ap.add_argument("--webhook", action="store_true", help="бот принимает апдейты вебхуком вместо long polling")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [supervisor] %(levelname)s: %(message)s")
+
+    sup = load_config().supervisor
+    roles = [r.strip() for r in args.roles.split(",")] if args.roles else sup.roles
+    unknown = set(roles) - set(ROLES)
+    if unknown:
+        ap.error(f"неизвестные роли: {', '.join(sorted(unknown))}")
+    Supervisor(roles, args.webhook, restart_delay=sup.restart_delay, restart_delay_max=sup.restart_delay_max,
+               stable_after=sup.stable_after, stop_timeout=sup.stop_timeout).run()